@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+项目自动备份工具 - Merkle 校验清单
+作者：Jay
+版本：1.0
+
+每个备份保存一份清单：每个文件的 SHA-256 以及由此逐级计算出的目录哈希，
+根目录哈希（merkle_root）记录在备份日志中。
+  - 清单本身被篡改时，重新计算的根哈希与日志不一致
+  - 发现数据损坏时，从根目录开始只进入哈希不一致的子目录，即可定位损坏的文件
+"""
+
+import json
+import hashlib
+import posixpath
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def hash_bytes(data: bytes) -> str:
+    """
+    计算数据的 SHA-256
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_stream(stream, chunk_size: int = 1024 * 1024) -> str:
+    """
+    计算流的 SHA-256
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_merkle_tree(file_hashes: Dict[str, str]) -> Dict[str, str]:
+    """
+    根据文件哈希计算所有目录的哈希，返回 目录相对路径 -> 哈希（根目录为 ""）
+
+    目录哈希 = SHA-256(按名称排序的 "名称\\0类型:子哈希\\n")
+    """
+    children: Dict[str, Dict[str, str]] = {"": {}}
+    for rel_path, file_hash in file_hashes.items():
+        parent, name = posixpath.split(rel_path)
+        children.setdefault(parent, {})[name] = "f:" + file_hash
+        # 确保所有上级目录都存在
+        while parent:
+            children.setdefault(posixpath.dirname(parent), {})
+            children.setdefault(parent, {})
+            parent = posixpath.dirname(parent)
+
+    dir_hashes = {}
+    # 从最深的目录开始计算
+    for rel_dir in sorted(children, key=lambda d: d.count("/") + (1 if d else 0), reverse=True):
+        lines = "".join(f"{name}\0{value}\n" for name, value in sorted(children[rel_dir].items()))
+        dir_hash = hash_bytes(lines.encode('utf-8'))
+        dir_hashes[rel_dir] = dir_hash
+        if rel_dir:
+            parent, name = posixpath.split(rel_dir)
+            children[parent][name] = "d:" + dir_hash
+    return dir_hashes
+
+
+def create_manifest(file_hashes: Dict[str, str]) -> Dict:
+    """
+    生成备份的校验清单
+    """
+    dirs = build_merkle_tree(file_hashes)
+    return {"root": dirs[""], "files": file_hashes, "dirs": dirs}
+
+
+def manifest_is_consistent(manifest: Dict, expected_root: str) -> bool:
+    """
+    检查清单是否完整（由文件哈希重新计算所有目录哈希，与清单中的目录哈希
+    以及日志中记录的根哈希比较，不读取备份数据）
+    """
+    dirs = build_merkle_tree(manifest["files"])
+    return (manifest.get("root") == expected_root
+            and dirs.get("") == expected_root
+            and manifest.get("dirs") == dirs)
+
+
+def find_corrupted(manifest: Dict, actual_hashes: Dict[str, Optional[str]]) -> List[str]:
+    """
+    沿 Merkle 树定位损坏的文件
+
+    actual_hashes 为本次实际校验的文件哈希（读取失败为 None），未校验的文件视为与清单一致。
+    从根目录开始比较目录哈希，只进入不一致的子目录。期望的目录哈希由清单中的文件哈希
+    重新计算，不使用清单中保存的目录哈希（它们可能被篡改）。
+    """
+    expected_dirs = build_merkle_tree(manifest["files"])
+    files = dict(manifest["files"])
+    for rel_path, actual_hash in actual_hashes.items():
+        files[rel_path] = actual_hash or ""
+    actual_dirs = build_merkle_tree(files)
+
+    children: Dict[str, List[str]] = {}
+    for rel_path in manifest["files"]:
+        children.setdefault(posixpath.dirname(rel_path), []).append(rel_path)
+    for rel_dir in expected_dirs:
+        if rel_dir:
+            children.setdefault(posixpath.dirname(rel_dir), []).append(rel_dir + "/")
+
+    corrupted = []
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        if actual_dirs.get(rel_dir) == expected_dirs.get(rel_dir):
+            continue
+        for child in children.get(rel_dir, []):
+            if child.endswith("/"):
+                pending.append(child[:-1])
+            elif files[child] != manifest["files"][child]:
+                corrupted.append(child)
+    return sorted(corrupted)
+
+
+def save_manifest(path: Path, manifest: Dict):
+    """
+    保存校验清单
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def load_manifest(path: Path) -> Optional[Dict]:
+    """
+    读取校验清单（不存在时返回 None）
+    """
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
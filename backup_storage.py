@@ -0,0 +1,945 @@
+#!/usr/bin/env python3
+"""
+项目自动备份工具 - 存储后端
+作者：Jay
+版本：1.0
+
+备份文件不再直接写入本地路径，而是通过存储后端读写：
+  - local: 本地文件系统（默认，与原有行为一致）
+  - s3:    S3 / MinIO 对象存储（需要安装 boto3）
+  - sftp:  SFTP 服务器（需要安装 paramiko）
+"""
+
+import io
+import os
+import json
+import time
+import shutil
+import posixpath
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+
+class StorageBackend:
+    """
+    存储后端基类
+
+    key 是备份在后端中的名称（压缩备份为 xxx.zip，文件夹备份为目录名，
+    文件夹内的文件为 目录名/相对路径）。
+    """
+
+    def uri(self, key: str) -> str:
+        """
+        返回记录到备份日志中的路径
+        """
+        raise NotImplementedError
+
+    def key_from_uri(self, uri: str) -> str:
+        """
+        从备份日志中的路径还原 key
+        """
+        prefix = self.uri("")
+        if uri.startswith(prefix):
+            return uri[len(prefix):]
+        return uri
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def mtime(self, key: str) -> float:
+        raise NotImplementedError
+
+    def open_write(self, key: str) -> BinaryIO:
+        """
+        打开一个只写流（对象存储上为并行分片上传）
+        """
+        raise NotImplementedError
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        """
+        读取 [offset, offset + length) 范围的数据
+        """
+        raise NotImplementedError
+
+    def open_read(self, key: str, buffer_size: int = 1024 * 1024) -> BinaryIO:
+        """
+        打开一个可随机访问的只读流（基于范围读取，用于选择性恢复）
+        """
+        raw = RangedReader(self, key, self.size(key))
+        return io.BufferedReader(raw, buffer_size=buffer_size)
+
+    def put_file(self, local_path: Path, key: str, digest=None):
+        """
+        上传本地文件
+
+        指定 digest（如 hashlib.sha256()）时边上传边计算哈希，源文件只读取一次
+        """
+        with open(local_path, 'rb') as src, self.open_write(key) as dst:
+            copy_with_digest(src, dst, digest)
+
+    def get_file(self, key: str, local_path: Path):
+        """
+        下载文件到本地
+        """
+        with self.open_read(key) as src, open(local_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def make_dir(self, key: str):
+        """
+        创建文件夹备份（源目录为空时备份也必须存在）
+        """
+        raise NotImplementedError
+
+    def list_root(self) -> List[str]:
+        """
+        列出存储根目录下的名称（压缩备份文件和文件夹备份，不递归）
+        """
+        raise NotImplementedError
+
+    def list_files(self, key: str) -> Iterator[str]:
+        """
+        列出文件夹备份中的所有文件（返回相对路径，使用 / 分隔）
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """
+        删除单个备份（文件或整个文件夹）
+        """
+        raise NotImplementedError
+
+    def replace(self, src_key: str, dst_key: str):
+        """
+        用 src_key 替换 dst_key（读取方只会看到旧的或新的完整内容）
+        """
+        with self.open_read(src_key) as src, self.open_write(dst_key) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        self.delete(src_key)
+
+    def free_space(self) -> Optional[int]:
+        """
+        剩余可用空间（字节），无法得知时返回 None
+        """
+        return None
+
+
+def copy_with_digest(src: BinaryIO, dst: BinaryIO, digest=None, chunk_size: int = 1024 * 1024):
+    """
+    复制数据流，指定 digest 时同时更新哈希
+    """
+    if digest is None:
+        shutil.copyfileobj(src, dst, chunk_size)
+        return
+    for chunk in iter(lambda: src.read(chunk_size), b""):
+        digest.update(chunk)
+        dst.write(chunk)
+
+
+class LocalStorage(StorageBackend):
+    """
+    本地文件系统存储（默认）
+
+    key 可以是相对备份目录的名称，也可以是旧日志中记录的绝对路径。
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def uri(self, key: str) -> str:
+        return str(self.path(key))
+
+    def key_from_uri(self, uri: str) -> str:
+        return uri
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def size(self, key: str) -> int:
+        return self.path(key).stat().st_size
+
+    def mtime(self, key: str) -> float:
+        return self.path(key).stat().st_mtime
+
+    def open_write(self, key: str) -> BinaryIO:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return open(path, 'wb')
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        with open(self.path(key), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def open_read(self, key: str, buffer_size: int = 1024 * 1024) -> BinaryIO:
+        return open(self.path(key), 'rb')
+
+    def put_file(self, local_path: Path, key: str, digest=None):
+        dest_path = self.path(key)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        if digest is None:
+            shutil.copy2(local_path, dest_path)
+            return
+        with open(local_path, 'rb') as src, open(dest_path, 'wb') as dst:
+            copy_with_digest(src, dst, digest)
+        shutil.copystat(local_path, dest_path)
+
+    def get_file(self, key: str, local_path: Path):
+        shutil.copy2(self.path(key), local_path)
+
+    def make_dir(self, key: str):
+        self.path(key).mkdir(parents=True, exist_ok=True)
+
+    def list_root(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return [item.name for item in self.root.iterdir()]
+
+    def list_files(self, key: str) -> Iterator[str]:
+        base = self.path(key)
+        for root, dirs, files in os.walk(base):
+            rel_path = Path(root).relative_to(base)
+            for file in files:
+                yield (rel_path / file).as_posix()
+
+    def delete(self, key: str):
+        path = self.path(key)
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    def replace(self, src_key: str, dst_key: str):
+        os.replace(self.path(src_key), self.path(dst_key))
+
+    def free_space(self) -> Optional[int]:
+        return shutil.disk_usage(self.root).free
+
+
+class RangedReader(io.RawIOBase):
+    """
+    基于 read_range 的可随机访问只读流
+
+    zipfile 只需要读取中央目录和被选中的成员，
+    因此选择性恢复时不必下载整个压缩包。
+    """
+
+    def __init__(self, storage: StorageBackend, key: str, size: int):
+        self.storage = storage
+        self.key = key
+        self._size = size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._size + offset
+        else:
+            raise ValueError(f"无效的 whence: {whence}")
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self._size - self._pos)
+        if length <= 0:
+            return 0
+        data = self.storage.read_range(self.key, self._pos, length)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+class MultipartWriter(io.RawIOBase):
+    """
+    并行分片上传的只写流
+
+    写入的数据按 part_size 切片后提交到线程池上传，
+    同时在途的分片数不超过 max_inflight，内存占用约为
+    (max_inflight + 1) * part_size。
+    该流不可 seek，zipfile 会自动改用数据描述符（data descriptor）格式。
+    """
+
+    def __init__(self, upload, part_size: int = 8 * 1024 * 1024,
+                 max_workers: int = 4, max_inflight: int = 8):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._upload = upload
+        self._part_size = part_size
+        self._buffer = bytearray()
+        self._pos = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max(max_inflight, 1))
+        self._futures = []
+        self._error: Optional[BaseException] = None
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("写入已关闭的流")
+        self._buffer += b
+        self._pos += len(b)
+        while len(self._buffer) >= self._part_size:
+            self._submit(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+        return len(b)
+
+    def _submit(self, data: bytes):
+        self._slots.acquire()
+        if self._error:
+            self._slots.release()
+            raise self._error
+        part_number = len(self._futures) + 1
+        future = self._executor.submit(self._upload.upload_part, part_number, data)
+        future.add_done_callback(self._on_done)
+        self._futures.append(future)
+
+    def _on_done(self, future):
+        if future.exception() and not self._error:
+            self._error = future.exception()
+        self._slots.release()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            # 最后一个分片（对象为空时也要上传一个空分片）
+            if self._buffer or not self._futures:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            parts = [future.result() for future in self._futures]
+            self._upload.complete(parts)
+        except BaseException:
+            self._upload.abort()
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self.closed:
+            # 出错时放弃上传，避免在存储上留下不完整的备份
+            self._executor.shutdown(wait=True)
+            self._upload.abort()
+            super().close()
+            return False
+        return super().__exit__(exc_type, exc, tb)
+
+
+class _S3MultipartUpload:
+    """
+    S3 分片上传会话
+    """
+
+    def __init__(self, client, bucket: str, key: str):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        response = client.create_multipart_upload(Bucket=bucket, Key=key)
+        self.upload_id = response["UploadId"]
+
+    def upload_part(self, part_number: int, data: bytes) -> Dict:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=data)
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def complete(self, parts: List[Dict]):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": parts})
+
+    def abort(self):
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception:
+            pass
+
+
+class S3Storage(StorageBackend):
+    """
+    S3 / MinIO 对象存储
+
+    通过 endpoint_url 可以连接本地 MinIO 或模拟服务器进行测试。
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, part_size: int = 8 * 1024 * 1024,
+                 max_workers: int = 4, max_inflight: int = 8):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("S3 存储需要安装 boto3: pip install boto3")
+
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint_url, region_name=region,
+            aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        # S3 要求除最后一个分片外每个分片至少 5MB
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        self.max_workers = max_workers
+        self.max_inflight = max_inflight
+
+    def _object_key(self, key: str) -> str:
+        return posixpath.join(self.prefix, key) if self.prefix else key
+
+    def _is_missing(self, error) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def _iter_objects(self, prefix: str) -> Iterator[Dict]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def key_from_uri(self, uri: str) -> str:
+        prefix = f"s3://{self.bucket}/"
+        if self.prefix:
+            prefix += self.prefix + "/"
+        return uri[len(prefix):] if uri.startswith(prefix) else uri
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            if not self._is_missing(e):
+                raise
+        # 文件夹备份以前缀形式存储
+        response = self.client.list_objects_v2(
+            Bucket=self.bucket, Prefix=self._object_key(key) + "/", MaxKeys=1)
+        return response.get("KeyCount", 0) > 0
+
+    def size(self, key: str) -> int:
+        response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response["ContentLength"]
+
+    def mtime(self, key: str) -> float:
+        response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response["LastModified"].timestamp()
+
+    def open_write(self, key: str) -> BinaryIO:
+        upload = _S3MultipartUpload(self.client, self.bucket, self._object_key(key))
+        return MultipartWriter(upload, self.part_size, self.max_workers, self.max_inflight)
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._object_key(key),
+            Range=f"bytes={offset}-{offset + length - 1}")
+        return response["Body"].read()
+
+    def put_file(self, local_path: Path, key: str, digest=None):
+        if Path(local_path).stat().st_size > self.part_size:
+            super().put_file(local_path, key, digest)
+        elif digest is None:
+            self.client.upload_file(str(local_path), self.bucket, self._object_key(key))
+        else:
+            # 小文件一次读入，计算哈希后用单个请求上传，不走分片上传
+            with open(local_path, 'rb') as f:
+                data = f.read()
+            digest.update(data)
+            self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+
+    def get_file(self, key: str, local_path: Path):
+        self.client.download_file(self.bucket, self._object_key(key), str(local_path))
+
+    def make_dir(self, key: str):
+        # 空的占位对象 key/，使 exists() 能找到空的文件夹备份
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key) + "/", Body=b"")
+
+    def list_root(self) -> List[str]:
+        prefix = self.prefix + "/" if self.prefix else ""
+        names = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter="/"):
+            for common in page.get("CommonPrefixes", []):
+                names.append(common["Prefix"][len(prefix):].rstrip("/"))
+            for obj in page.get("Contents", []):
+                names.append(obj["Key"][len(prefix):])
+        return names
+
+    def list_files(self, key: str) -> Iterator[str]:
+        prefix = self._object_key(key) + "/"
+        for obj in self._iter_objects(prefix):
+            rel_path = obj["Key"][len(prefix):]
+            if rel_path:
+                yield rel_path
+
+    def delete(self, key: str):
+        object_key = self._object_key(key)
+        self.client.delete_object(Bucket=self.bucket, Key=object_key)
+        batch = []
+        for obj in self._iter_objects(object_key + "/"):
+            batch.append({"Key": obj["Key"]})
+            if len(batch) == 1000:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch})
+                batch = []
+        if batch:
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch})
+
+    def replace(self, src_key: str, dst_key: str):
+        # 单个对象的写入本身是原子的，服务端复制后删除源对象
+        src = self._object_key(src_key)
+        self.client.copy_object(Bucket=self.bucket, Key=self._object_key(dst_key),
+                                CopySource={"Bucket": self.bucket, "Key": src})
+        self.client.delete_object(Bucket=self.bucket, Key=src)
+
+
+class SFTPStorage(StorageBackend):
+    """
+    SFTP 服务器存储
+    """
+
+    def __init__(self, host: str, root: str, port: int = 22, username: Optional[str] = None,
+                 password: Optional[str] = None, key_filename: Optional[str] = None):
+        try:
+            import paramiko
+        except ImportError:
+            raise RuntimeError("SFTP 存储需要安装 paramiko: pip install paramiko")
+
+        self.host = host
+        self.root = root.rstrip("/") or "/"
+        self.ssh = paramiko.SSHClient()
+        self.ssh.load_system_host_keys()
+        self.ssh.connect(host, port=port, username=username, password=password,
+                         key_filename=key_filename)
+        self.sftp = self.ssh.open_sftp()
+
+    def _path(self, key: str) -> str:
+        return posixpath.join(self.root, key)
+
+    def _makedirs(self, path: str):
+        parts = []
+        while path not in ("", "/"):
+            try:
+                self.sftp.stat(path)
+                break
+            except IOError:
+                parts.append(path)
+                path = posixpath.dirname(path)
+        for part in reversed(parts):
+            self.sftp.mkdir(part)
+
+    def _is_dir(self, path: str) -> bool:
+        import stat
+        return stat.S_ISDIR(self.sftp.stat(path).st_mode)
+
+    def uri(self, key: str) -> str:
+        return f"sftp://{self.host}{self._path(key)}"
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.sftp.stat(self._path(key))
+            return True
+        except IOError:
+            return False
+
+    def size(self, key: str) -> int:
+        return self.sftp.stat(self._path(key)).st_size
+
+    def mtime(self, key: str) -> float:
+        return self.sftp.stat(self._path(key)).st_mtime
+
+    def open_write(self, key: str) -> BinaryIO:
+        path = self._path(key)
+        self._makedirs(posixpath.dirname(path))
+        f = self.sftp.open(path, 'wb')
+        # 流水线写入，不必等待每个数据块的确认
+        f.set_pipelined(True)
+        return f
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        with self.sftp.open(self._path(key), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def open_read(self, key: str, buffer_size: int = 1024 * 1024) -> BinaryIO:
+        return self.sftp.open(self._path(key), 'rb', bufsize=buffer_size)
+
+    def put_file(self, local_path: Path, key: str, digest=None):
+        if digest is not None:
+            super().put_file(local_path, key, digest)
+            return
+        path = self._path(key)
+        self._makedirs(posixpath.dirname(path))
+        self.sftp.put(str(local_path), path)
+
+    def get_file(self, key: str, local_path: Path):
+        self.sftp.get(self._path(key), str(local_path))
+
+    def make_dir(self, key: str):
+        self._makedirs(self._path(key))
+
+    def list_root(self) -> List[str]:
+        return self.sftp.listdir(self.root)
+
+    def list_files(self, key: str) -> Iterator[str]:
+        base = self._path(key)
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            for attr in self.sftp.listdir_attr(posixpath.join(base, rel_dir)):
+                rel_path = posixpath.join(rel_dir, attr.filename)
+                if attr.st_mode is not None and (attr.st_mode & 0o170000) == 0o040000:
+                    pending.append(rel_path)
+                else:
+                    yield rel_path
+
+    def delete(self, key: str):
+        path = self._path(key)
+        if not self._is_dir(path):
+            self.sftp.remove(path)
+            return
+        files = list(self.list_files(key))
+        for rel_path in files:
+            self.sftp.remove(posixpath.join(path, rel_path))
+        # 从最深的目录开始删除
+        dirs = set()
+        for rel_path in files:
+            rel_dir = posixpath.dirname(rel_path)
+            while rel_dir:
+                dirs.add(rel_dir)
+                rel_dir = posixpath.dirname(rel_dir)
+        for rel_dir in sorted(dirs, key=lambda d: d.count("/"), reverse=True):
+            try:
+                self.sftp.rmdir(posixpath.join(path, rel_dir))
+            except IOError:
+                pass
+        self.sftp.rmdir(path)
+
+    def replace(self, src_key: str, dst_key: str):
+        self.sftp.posix_rename(self._path(src_key), self._path(dst_key))
+
+
+class VolumeWriter(io.RawIOBase):
+    """
+    分卷输出流：写满 volume_size 后自动切换到下一个分卷（name.000, name.001 ...）
+
+    该流不可 seek，适合流式 tar 或带数据描述符的 zip。
+    """
+
+    def __init__(self, base_path: str, volume_size: int):
+        self.base_path = base_path
+        self.volume_size = volume_size
+        self.volumes: List[str] = []
+        self._file: Optional[BinaryIO] = None
+        self._volume_pos = 0
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def write(self, b) -> int:
+        view = memoryview(b)
+        while view:
+            if self._file is None or self._volume_pos >= self.volume_size:
+                self._next_volume()
+            chunk = view[:self.volume_size - self._volume_pos]
+            self._file.write(chunk)
+            self._volume_pos += len(chunk)
+            view = view[len(chunk):]
+        self._pos += len(b)
+        return len(b)
+
+    def _next_volume(self):
+        if self._file is not None:
+            self._file.close()
+        path = f"{self.base_path}.{len(self.volumes):03d}"
+        self.volumes.append(path)
+        self._file = open(path, 'wb')
+        self._volume_pos = 0
+
+    def close(self):
+        if self.closed:
+            return
+        if self._file is None:
+            # 空输出也生成一个分卷
+            self._next_volume()
+        self._file.close()
+        super().close()
+
+
+class VolumeReader(io.RawIOBase):
+    """
+    按顺序读取 name.000, name.001 ... 分卷，拼接成一个只读流
+    """
+
+    def __init__(self, base_path: str):
+        self.volumes = []
+        while os.path.exists(f"{base_path}.{len(self.volumes):03d}"):
+            self.volumes.append(f"{base_path}.{len(self.volumes):03d}")
+        if not self.volumes:
+            raise FileNotFoundError(f"找不到分卷: {base_path}.000")
+        self._index = 0
+        self._file = open(self.volumes[0], 'rb')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            count = self._file.readinto(buffer)
+            if count or self._index + 1 >= len(self.volumes):
+                return count
+            self._file.close()
+            self._index += 1
+            self._file = open(self.volumes[self._index], 'rb')
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+# 小文件打包目录（位于文件夹备份内部）
+PACK_DIR = "__backup_packs__"
+PACK_INDEX = f"{PACK_DIR}/index.json"
+
+
+class SmallFilePacker:
+    """
+    文件夹备份的小文件打包器
+
+    小于阈值的文件依次追加到大的打包段（pack_00000.dat ...）中，
+    并在 index.json 中记录 相对路径 -> [段号, 偏移, 长度, 修改时间, 权限]，
+    这样几十万个小文件只占用少量 inode，恢复时按索引一次 seek 即可读出。
+    """
+
+    def __init__(self, storage: StorageBackend, backup_key: str,
+                 segment_size: int = 64 * 1024 * 1024, first_segment: int = 0):
+        self.storage = storage
+        self.backup_key = backup_key
+        self.segment_size = segment_size
+        self.index: Dict[str, List] = {}
+        self._segment: Optional[BinaryIO] = None
+        self._segment_no = first_segment - 1
+        self._offset = 0
+
+    def segment_key(self, segment_no: int) -> str:
+        return f"{self.backup_key}/{PACK_DIR}/pack_{segment_no:05d}.dat"
+
+    def add(self, file_path: Path, rel_path: str):
+        """
+        把一个小文件追加到当前打包段，返回文件内容的 SHA-256
+        """
+        import hashlib
+
+        stat = file_path.stat()
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        self.add_bytes(rel_path, data, stat.st_mtime, stat.st_mode & 0o7777)
+        return hashlib.sha256(data).hexdigest()
+
+    def add_bytes(self, rel_path: str, data: bytes, mtime: float, mode: int):
+        """
+        把一段数据作为一个文件追加到当前打包段
+        """
+        if self._segment is None or self._offset >= self.segment_size:
+            self._next_segment()
+        self._segment.write(data)
+        self.index[rel_path] = [self._segment_no, self._offset, len(data), mtime, mode]
+        self._offset += len(data)
+
+    def _next_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_no += 1
+        self._segment = self.storage.open_write(self.segment_key(self._segment_no))
+        self._offset = 0
+
+    def close(self, write_index: bool = True):
+        """
+        关闭当前打包段并写入索引（write_index 为 False 时只关闭段文件）
+        """
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if write_index and self.index:
+            save_pack_index(self.storage, self.backup_key, self.index)
+
+
+def save_pack_index(storage: StorageBackend, backup_key: str, index: Dict[str, List]):
+    """
+    写入小文件索引：先写临时对象再替换，读取方不会看到写了一半的索引
+    """
+    index_key = f"{backup_key}/{PACK_INDEX}"
+    with storage.open_write(index_key + ".tmp") as f:
+        f.write(json.dumps(index, ensure_ascii=False).encode('utf-8'))
+    storage.replace(index_key + ".tmp", index_key)
+
+
+def load_pack_index(storage: StorageBackend, backup_key: str) -> Dict[str, List]:
+    """
+    读取文件夹备份的小文件索引（未打包的备份返回空字典）
+    """
+    index_key = f"{backup_key}/{PACK_INDEX}"
+    if not storage.exists(index_key):
+        return {}
+    with storage.open_read(index_key) as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def iter_packed_files(storage: StorageBackend, backup_key: str, index: Dict[str, List]):
+    """
+    按打包段和偏移顺序读取打包的小文件，每个段只打开一次
+
+    返回 (相对路径, 数据, 修改时间, 权限)
+    """
+    entries = sorted(index.items(), key=lambda item: (item[1][0], item[1][1]))
+    reader = None
+    current_segment = None
+    try:
+        for rel_path, (segment_no, offset, length, mtime, mode) in entries:
+            if segment_no != current_segment:
+                if reader is not None:
+                    reader.close()
+                reader = storage.open_read(f"{backup_key}/{PACK_DIR}/pack_{segment_no:05d}.dat")
+                current_segment = segment_no
+            reader.seek(offset)
+            yield rel_path, reader.read(length), mtime, mode
+    finally:
+        if reader is not None:
+            reader.close()
+
+
+def list_pack_segments(storage: StorageBackend, backup_key: str) -> Dict[int, int]:
+    """
+    列出文件夹备份中实际存在的打包段，返回 段号 -> 大小
+    """
+    segments = {}
+    pack_key = f"{backup_key}/{PACK_DIR}"
+    if not storage.exists(pack_key):
+        return segments
+    for name in storage.list_files(pack_key):
+        if name.startswith("pack_") and name.endswith(".dat") and "/" not in name:
+            segments[int(name[5:-4])] = storage.size(f"{pack_key}/{name}")
+    return segments
+
+
+def pack_is_compact(index: Dict[str, List], segments: Dict[int, int], segment_size: int) -> bool:
+    """
+    判断打包段是否已经紧凑：没有未引用的数据（中断的整理留下的段），并且除最后一段外都已写满
+    """
+    if sum(entry[2] for entry in index.values()) != sum(segments.values()):
+        return False
+    ordered = sorted(segments)
+    return all(segments[segment_no] >= segment_size for segment_no in ordered[:-1])
+
+
+def repack_small_files(storage: StorageBackend, backup_key: str, index: Dict[str, List],
+                       segment_size: int, first_segment: int,
+                       throttle: Optional["IOThrottle"] = None,
+                       max_read: int = 8 * 1024 * 1024) -> Dict[str, List]:
+    """
+    按相对路径顺序把打包的小文件重写到从 first_segment 开始的新段中，返回新索引
+
+    按路径排序后在同一段中首尾相接的文件合并为一次范围读取（最多 max_read 字节），
+    不保持打开的读取流，对象存储上不会因为缓冲而读取多余的数据；限速按实际读写的字节数计算。
+    旧的段和索引保持不变，由调用方用 save_pack_index 切换到新索引后再删除旧段。
+    """
+    packer = SmallFilePacker(storage, backup_key, segment_size, first_segment)
+    entries = sorted(index.items())
+    try:
+        start = 0
+        while start < len(entries):
+            segment_no, offset, length = entries[start][1][:3]
+            end = start + 1
+            run_length = length
+            while (end < len(entries) and run_length < max_read
+                   and entries[end][1][0] == segment_no
+                   and entries[end][1][1] == offset + run_length):
+                run_length += entries[end][1][2]
+                end += 1
+
+            data = b""
+            if run_length:
+                data = storage.read_range(f"{backup_key}/{PACK_DIR}/pack_{segment_no:05d}.dat",
+                                          offset, run_length)
+                if len(data) != run_length:
+                    raise IOError(f"打包段数据不完整: {entries[start][0]}")
+                if throttle:
+                    throttle.consume(len(data))
+
+            position = 0
+            for rel_path, (_, _, length, mtime, mode) in entries[start:end]:
+                packer.add_bytes(rel_path, data[position:position + length], mtime, mode)
+                position += length
+            if throttle:
+                throttle.consume(run_length)
+            start = end
+    finally:
+        packer.close(write_index=False)
+    return packer.index
+
+
+class IOThrottle:
+    """
+    I/O 限速（令牌桶），rate 为每秒允许读写的字节数，0 表示不限速
+    """
+
+    def __init__(self, rate: int, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1024 * 1024)
+        self._allowance = float(self.burst)
+        self._last = time.monotonic()
+
+    def consume(self, nbytes: int):
+        """
+        记录 nbytes 字节的读写，超出速率时等待
+        """
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._allowance = min(self.burst, self._allowance + (now - self._last) * self.rate)
+        self._last = now
+        self._allowance -= nbytes
+        if self._allowance < 0:
+            time.sleep(-self._allowance / self.rate)
+
+
+def create_storage(storage_config: Optional[Dict], backup_dir: Path) -> StorageBackend:
+    """
+    根据配置创建存储后端
+    """
+    storage_config = dict(storage_config or {})
+    storage_type = storage_config.pop("type", "local")
+
+    if storage_type == "local":
+        return LocalStorage(Path(storage_config.get("root", backup_dir)))
+    if storage_type == "s3":
+        return S3Storage(**storage_config)
+    if storage_type == "sftp":
+        return SFTPStorage(**storage_config)
+    raise ValueError(f"不支持的存储类型: {storage_type}")
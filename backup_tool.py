@@ -5,24 +5,115 @@
 版本：1.0
 """
 
+import io
 import os
 import shutil
 import json
 import datetime
 import sys
-import hashlib
+import time
 from pathlib import Path
-import zipfile
 import argparse
+import contextlib
 from typing import List, Dict, Optional
+from backup_storage import (StorageBackend, SmallFilePacker, PACK_DIR, VolumeWriter, VolumeReader,
+                            IOThrottle, create_storage, load_pack_index, save_pack_index,
+                            iter_packed_files, list_pack_segments, pack_is_compact,
+                            repack_small_files)
+
+# zipfile、tarfile、hashlib 等较重的模块只在需要时导入，
+# 让 --list / --status 等只读命令启动更快
+
+
+def format_size(size: float) -> str:
+    """
+    格式化文件大小
+    """
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(size) < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+
+def parse_size(value: str) -> int:
+    """
+    解析大小字符串，如 "100M"、"4G"、"65536"
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def size_argument(value: str) -> int:
+    """
+    命令行大小参数（argparse 的 type），格式错误时给出用法错误而不是异常
+    """
+    try:
+        size = parse_size(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的大小: {value}（示例: 65536、100M、4G）")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"大小不能为负数: {value}")
+    return size
+
+
+def make_path_filter(paths: Optional[List[str]]):
+    """
+    生成选择性恢复的路径过滤函数（paths 为空时全部选中）
+    """
+    def selected(name: str) -> bool:
+        if not paths:
+            return True
+        return any(name == p or name.startswith(p.rstrip("/") + "/") for p in paths)
+    return selected
+
+
+class FailureReport:
+    """
+    恢复失败记录
+    
+    内存中只保留计数和前 sample_size 条样本；指定 report_file 时全部记录追加写入该文件，
+    文件数量很大时内存占用也不会增长。
+    """
+    
+    def __init__(self, report_file: Optional[Path] = None, label: str = "", sample_size: int = 10):
+        self.report_file = report_file
+        self.label = label
+        self.sample_size = sample_size
+        self.count = 0
+        self.samples: List[str] = []
+        self._file = None
+    
+    def append(self, item: str):
+        self.count += 1
+        if len(self.samples) < self.sample_size:
+            self.samples.append(item)
+        if self.report_file:
+            if self._file is None:
+                self._file = open(self.report_file, 'a', encoding='utf-8')
+            self._file.write(f"{self.label}{item}\n")
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def __len__(self) -> int:
+        return self.count
 
 
 class ProjectBackupTool:
 
-    def __init__(self, config_file: str = "config.json"):
+    def __init__(self, config_file: str = "config.json", read_only: bool = False):
         """
         初始化备份工具
+        
+        read_only 为 True 时不创建配置文件和备份目录，也不改写备份日志，
+        用于列表、详情、状态等只读命令
         """
+        self.read_only = read_only
         self.current_dir = Path.cwd()
         self.config_file = self.current_dir / config_file
         self.config = self.load_config()
@@ -35,11 +126,43 @@ class ProjectBackupTool:
                               self.current_dir.parent / "project_backups"))
         
         # 确保备份目录存在
-        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        if not read_only:
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
         
-        # 备份日志文件
+        # 备份存储后端（默认为本地备份目录），首次使用时才创建
+        self._storage = None
+        
+        # 备份日志文件（首次使用时才加载）
         self.log_file = self.backup_dir / "backup_log.json"
-        self.backup_log = self.load_backup_log()
+        self._backup_log = None
+        
+        # 备份目录摘要（备份数量、最新备份），供 --status 快速读取
+        self.catalog_file = self.backup_dir / "catalog_summary.json"
+        
+        # 目录扫描缓存文件
+        self.scan_cache_file = self.backup_dir / "scan_cache.json"
+    
+    @property
+    def storage(self) -> StorageBackend:
+        """
+        备份存储后端
+        """
+        if self._storage is None:
+            self._storage = create_storage(self.config.get("storage"), self.backup_dir)
+        return self._storage
+    
+    @property
+    def backup_log(self) -> List[Dict]:
+        """
+        备份日志
+        """
+        if self._backup_log is None:
+            self._backup_log = self.load_backup_log()
+        return self._backup_log
+    
+    @backup_log.setter
+    def backup_log(self, backup_log: List[Dict]):
+        self._backup_log = backup_log
     
     def set_source_dir(self, source_dir: str):
         """
@@ -65,8 +188,11 @@ class ProjectBackupTool:
         """
         self.backup_dir = Path(backup_dir)
         self.backup_dir.mkdir(parents=True, exist_ok=True)
+        self._storage = None
         self.log_file = self.backup_dir / "backup_log.json"
         self.backup_log = self.load_backup_log()
+        self.catalog_file = self.backup_dir / "catalog_summary.json"
+        self.scan_cache_file = self.backup_dir / "scan_cache.json"
         
         # 更新配置
         self.config["backup_dir"] = backup_dir
@@ -94,7 +220,19 @@ class ProjectBackupTool:
             ],
             "max_backups": 50,
             "compression": True,
-            "hash_check": True
+            "hash_check": True,
+            "storage": {"type": "local"},
+            "pack_small_files": False,
+            "pack_threshold": 64 * 1024,
+            "pack_segment_size": 64 * 1024 * 1024,
+            "scan_cache": True,
+            "scan_full_rescan_every": 10,
+            "estimate_sample_files": 64,
+            "estimate_sample_bytes": 1024 * 1024,
+            "stream_format": "tar",
+            "scrub_sample_files": 32,
+            "low_memory": False,
+            "compact_io_limit": 0
         }
         
         if self.config_file.exists():
@@ -106,7 +244,7 @@ class ProjectBackupTool:
                 print(f"✓ 已加载配置文件: {self.config_file}")
             except json.JSONDecodeError:
                 print(f"⚠ 配置文件格式错误，使用默认配置")
-        else:
+        elif not self.read_only:
             # 创建默认配置文件
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(default_config, f, indent=4, ensure_ascii=False)
@@ -116,33 +254,175 @@ class ProjectBackupTool:
     
     def load_backup_log(self) -> List[Dict]:
         """
-        加载备份日志
+        加载备份日志（日志文件无法解析时 backup_log_valid 为 False）
         """
+        self.backup_log_valid = True
         if self.log_file.exists():
             try:
                 with open(self.log_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
             except:
+                self.backup_log_valid = False
                 return []
         return []
     
     def save_backup_log(self):
         """
-        保存备份日志
+        保存备份日志（同时更新备份目录摘要）
         """
+        if self.read_only:
+            return
         with open(self.log_file, 'w', encoding='utf-8') as f:
             json.dump(self.backup_log, f, indent=4, ensure_ascii=False)
+        self.save_catalog_summary(self.build_catalog_summary())
+    
+    def build_catalog_summary(self) -> Dict:
+        """
+        根据备份日志生成摘要，记录日志文件的修改时间和大小用于判断摘要是否过期
+        """
+        log_stat = self.log_file.stat()
+        latest = max(self.backup_log, key=lambda x: x["timestamp"], default=None)
+        return {
+            "log_mtime_ns": log_stat.st_mtime_ns,
+            "log_size": log_stat.st_size,
+            "count": len(self.backup_log),
+            "latest": latest
+        }
+    
+    def save_catalog_summary(self, summary: Dict):
+        """
+        保存备份目录摘要
+        """
+        with open(self.catalog_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4, ensure_ascii=False)
+    
+    def catalog_summary(self) -> Dict:
+        """
+        读取备份目录摘要（摘要与备份日志一致时不需要解析整个日志）
+        """
+        try:
+            log_stat = self.log_file.stat()
+        except FileNotFoundError:
+            return {"count": 0, "latest": None}
+        
+        try:
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            if (summary.get("log_mtime_ns") == log_stat.st_mtime_ns
+                    and summary.get("log_size") == log_stat.st_size):
+                return summary
+        except:
+            pass
+        
+        # 摘要不存在或已过期，重新生成
+        summary = self.build_catalog_summary()
+        if not self.read_only:
+            self.save_catalog_summary(summary)
+        return summary
+    
+    def scan_cache_enabled(self) -> bool:
+        """
+        是否使用目录扫描缓存（低内存模式下缓存会随目录数增长，因此不使用）
+        """
+        return self.config.get("scan_cache", True) and not self.config.get("low_memory", False)
+    
+    def load_scan_cache(self) -> Dict:
+        """
+        加载目录扫描缓存（源目录不同或到了全量扫描周期时返回空缓存）
+        """
+        empty_cache = {"source_dir": str(self.source_dir), "runs": 0, "dirs": {}}
+        if not self.scan_cache_enabled() or not self.scan_cache_file.exists():
+            return empty_cache
+        try:
+            with open(self.scan_cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except:
+            return empty_cache
+        if cache.get("source_dir") != str(self.source_dir):
+            return empty_cache
+        
+        # 定期全量扫描，防止缓存出现偏差
+        full_rescan_every = self.config.get("scan_full_rescan_every", 10)
+        if full_rescan_every and cache.get("runs", 0) % full_rescan_every == 0:
+            cache["dirs"] = {}
+        return cache
+    
+    def save_scan_cache(self, cache: Dict):
+        """
+        保存目录扫描缓存
+        """
+        if not self.scan_cache_enabled():
+            return
+        with open(self.scan_cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+    
+    def iter_source_files(self, source_dir: Optional[Path] = None):
+        """
+        遍历源目录中需要备份的文件，返回 (文件路径, 相对路径)
+        
+        每个目录的子项列表按 目录路径 -> (mtime, inode) 缓存，目录元数据未变化时
+        直接复用缓存的子项列表，不再重新列目录（文件本身仍会在备份时读取）。
+        指定 source_dir 时遍历该目录（批量备份），不使用缓存。
+        """
+        use_cache = source_dir is None
+        source_dir = source_dir or self.source_dir
+        cache = self.load_scan_cache() if use_cache else {"dirs": {}}
+        cached_dirs = cache["dirs"]
+        scanned_dirs = {}
+        keep_cache = use_cache and self.scan_cache_enabled()
+        now = time.time()
+        
+        pending = [source_dir]
+        while pending:
+            dir_path = pending.pop()
+            rel_dir = dir_path.relative_to(source_dir).as_posix()
+            try:
+                dir_stat = dir_path.stat()
+                entry = cached_dirs.get(rel_dir)
+                if not (entry and entry["mtime"] == dir_stat.st_mtime_ns
+                        and entry["ino"] == dir_stat.st_ino):
+                    entry = {"mtime": dir_stat.st_mtime_ns, "ino": dir_stat.st_ino,
+                             "dirs": [], "files": []}
+                    with os.scandir(dir_path) as it:
+                        for item in it:
+                            if item.is_dir():
+                                # 与 os.walk 一致，不进入符号链接目录
+                                if not item.is_symlink():
+                                    entry["dirs"].append(item.name)
+                            else:
+                                entry["files"].append(item.name)
+            except OSError:
+                continue
+            
+            # 刚修改过的目录可能在同一时间精度内再次变化，不写入缓存
+            if keep_cache and now - dir_stat.st_mtime > 2:
+                scanned_dirs[rel_dir] = entry
+            
+            # 过滤掉需要排除的目录
+            for d in reversed(entry["dirs"]):
+                if not self.should_exclude(dir_path / d):
+                    pending.append(dir_path / d)
+            
+            for file in entry["files"]:
+                file_path = dir_path / file
+                if not self.should_exclude(file_path):
+                    # 计算相对路径
+                    yield file_path, file_path.relative_to(source_dir)
+        
+        if use_cache:
+            cache["dirs"] = scanned_dirs
+            cache["runs"] = cache.get("runs", 0) + 1
+            self.save_scan_cache(cache)
     
     def calculate_file_hash(self, filepath: Path) -> str:
         """
-        计算文件哈希值（用于校验）
+        计算文件哈希值（SHA-256，用于校验清单）
         """
-        hash_md5 = hashlib.md5()
+        from backup_manifest import hash_stream
+        
         try:
             with open(filepath, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+                return hash_stream(f)
         except:
             return ""
     
@@ -180,43 +460,217 @@ class ProjectBackupTool:
         
         return False
     
-    def create_zip_backup(self, backup_path: Path, version_id: str):
+    def backup_key(self, backup_info: Dict) -> str:
+        """
+        获取备份在存储后端中的名称
+        """
+        return self.storage.key_from_uri(backup_info["path"])
+    
+    def create_zip_backup(self, backup_file, version_id: str) -> Dict[str, str]:
         """
         创建压缩备份（支持大文件）
+        
+        backup_file 可以是本地路径，也可以是存储后端打开的只写流；
+        写入时同时计算每个文件的哈希，返回 相对路径 -> 哈希
         """
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(self.source_dir):
-                # 过滤掉需要排除的目录
-                dirs[:] = [d for d in dirs if not self.should_exclude(Path(root) / d)]
-                
-                for file in files:
-                    file_path = Path(root) / file
-                    if not self.should_exclude(file_path):
-                        # 计算相对路径
-                        rel_path = file_path.relative_to(self.source_dir)
-                        zipf.write(file_path, rel_path)
+        import zipfile
+        
+        if self.config.get("low_memory", False):
+            # 低内存模式：中央目录溢写到磁盘，不保存文件哈希
+            from backup_zip import SpillingZipWriter
+            
+            with SpillingZipWriter(backup_file, spill_dir=str(self.backup_dir)) as zipw:
+                for file_path, rel_path in self.iter_source_files():
+                    zipw.add_file(file_path, rel_path.as_posix())
+            return {}
+        
+        file_hashes = {}
+        with zipfile.ZipFile(backup_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for file_path, rel_path in self.iter_source_files():
+                file_hashes[rel_path.as_posix()] = self.write_zip_member(zipf, file_path, rel_path.as_posix())
+        return file_hashes
     
-    def create_folder_backup(self, backup_path: Path, version_id: str):
+    def write_zip_member(self, zipf, file_path: Path, arcname: str) -> str:
         """
-        创建文件夹备份（支持大文件）
+        把文件写入压缩包，同时计算 SHA-256（文件只读取一次）
         """
-        for root, dirs, files in os.walk(self.source_dir):
-            # 过滤掉需要排除的目录
-            dirs[:] = [d for d in dirs if not self.should_exclude(Path(root) / d)]
+        import hashlib
+        import zipfile
+        
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as src, zipf.open(zinfo, 'w') as dest:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                digest.update(chunk)
+                dest.write(chunk)
+        return digest.hexdigest()
+    
+    def create_folder_backup(self, backup_key: str, version_id: str) -> Dict[str, str]:
+        """
+        创建文件夹备份（支持大文件），返回 相对路径 -> 哈希
+        
+        开启 pack_small_files 时，小于 pack_threshold 的文件遍历结束后按相对路径排序打包到段文件中，
+        大文件仍按原样保存；哈希在写入备份的同时计算，每个源文件只读取一次
+        """
+        import hashlib
+        
+        hash_check = self.config.get("hash_check", True) and not self.config.get("low_memory", False)
+        file_hashes = {}
+        packer = None
+        if self.config.get("pack_small_files", False):
+            packer = SmallFilePacker(self.storage, backup_key,
+                                     self.config.get("pack_segment_size", 64 * 1024 * 1024))
+        threshold = self.config.get("pack_threshold", 64 * 1024)
+        
+        self.storage.make_dir(backup_key)
+        small_files = []
+        try:
+            for file_path, rel_path in self.iter_source_files():
+                if packer and file_path.stat().st_size < threshold:
+                    small_files.append((rel_path.as_posix(), file_path))
+                    continue
+                digest = hashlib.sha256() if hash_check else None
+                self.storage.put_file(file_path, f"{backup_key}/{rel_path.as_posix()}", digest)
+                if hash_check:
+                    file_hashes[rel_path.as_posix()] = digest.hexdigest()
             
-            for file in files:
-                file_path = Path(root) / file
-                if not self.should_exclude(file_path):
-                    # 计算相对路径
-                    rel_path = file_path.relative_to(self.source_dir)
-                    dest_path = backup_path / rel_path
-                    dest_path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(file_path, dest_path)
+            # 按相对路径顺序打包，恢复同一目录时读取的是连续的数据，--compact 也不需要重新排序
+            small_files.sort()
+            for rel_file, file_path in small_files:
+                file_hash = packer.add(file_path, rel_file)
+                if hash_check:
+                    file_hashes[rel_file] = file_hash
+        finally:
+            if packer:
+                packer.close()
+        return file_hashes
     
-    def create_backup(self, comment: str = ""):
+    def estimate_backup(self) -> Dict:
+        """
+        预估备份大小和耗时（只遍历源目录，不写入任何备份）
+        
+        随机抽样部分文件压缩后，按文件大小加权得到压缩率（比率估计），
+        并用样本的读取/压缩速度推算总耗时。
+        """
+        import random
+        import zlib
+        
+        sample_files = self.config.get("estimate_sample_files", 64)
+        sample_bytes = self.config.get("estimate_sample_bytes", 1024 * 1024)
+        compression = self.config.get("compression", True)
+        
+        # 遍历源目录，同时做蓄水池抽样
+        scan_start = time.perf_counter()
+        file_count = 0
+        total_size = 0
+        name_bytes = 0
+        reservoir = []
+        for file_path, rel_path in self.iter_source_files():
+            try:
+                size = file_path.stat().st_size
+            except OSError:
+                continue
+            file_count += 1
+            total_size += size
+            name_bytes += len(rel_path.as_posix().encode('utf-8'))
+            if len(reservoir) < sample_files:
+                reservoir.append((file_path, size))
+            else:
+                slot = random.randrange(file_count)
+                if slot < sample_files:
+                    reservoir[slot] = (file_path, size)
+        scan_time = time.perf_counter() - scan_start
+        
+        # 读取并压缩样本
+        read_bytes = 0
+        read_time = 0.0
+        compress_time = 0.0
+        weighted_ratio = 0.0
+        sampled_size = 0
+        sampled_files_count = 0
+        for file_path, size in reservoir:
+            try:
+                start = time.perf_counter()
+                with open(file_path, 'rb') as f:
+                    data = f.read(sample_bytes)
+                read_time += time.perf_counter() - start
+            except OSError:
+                continue
+            if not data:
+                continue
+            start = time.perf_counter()
+            compressed = len(zlib.compress(data, 6))
+            compress_time += time.perf_counter() - start
+            read_bytes += len(data)
+            # 只压缩了文件开头一部分，用这部分的压缩率代表整个文件
+            weighted_ratio += size * compressed / len(data)
+            sampled_size += size
+            sampled_files_count += 1
+        
+        ratio = min(weighted_ratio / sampled_size, 1.0) if sampled_size else 1.0
+        read_speed = read_bytes / read_time if read_time > 0 else 0
+        compress_speed = read_bytes / compress_time if compress_time > 0 else 0
+        
+        if compression:
+            # 每个成员约有 76 字节的本地文件头和中央目录项，外加两份文件名
+            estimated_size = int(total_size * ratio) + file_count * 76 + name_bytes * 2
+        else:
+            estimated_size = total_size
+        
+        estimated_time = 0.0
+        if read_speed:
+            estimated_time += total_size / read_speed
+        if compression and compress_speed:
+            estimated_time += total_size / compress_speed
+        
+        free_space = self.storage.free_space()
+        return {
+            "file_count": file_count,
+            "total_size": total_size,
+            "compression_ratio": ratio if compression else 1.0,
+            "estimated_size": estimated_size,
+            "scan_time": scan_time,
+            "read_speed": read_speed,
+            "compress_speed": compress_speed,
+            "estimated_time": scan_time + estimated_time,
+            "sampled_files": sampled_files_count,
+            "free_space": free_space,
+            # 预留 10% 余量
+            "fits": free_space is None or free_space >= estimated_size * 1.1
+        }
+    
+    def print_estimate(self, estimate: Dict):
+        """
+        输出预估结果
+        """
+        print(f"文件数量: {estimate['file_count']}")
+        print(f"源文件大小: {format_size(estimate['total_size'])}")
+        print(f"预估备份大小: {format_size(estimate['estimated_size'])}"
+              f"（压缩率 {estimate['compression_ratio']:.1%}，抽样 {estimate['sampled_files']} 个文件）")
+        if estimate["read_speed"]:
+            print(f"读取速度: {format_size(estimate['read_speed'])}/s")
+        if estimate["compress_speed"]:
+            print(f"压缩速度: {format_size(estimate['compress_speed'])}/s")
+        print(f"预估耗时: {estimate['estimated_time']:.1f} 秒")
+        if estimate["free_space"] is not None:
+            print(f"备份位置剩余空间: {format_size(estimate['free_space'])}")
+        if not estimate["fits"]:
+            print("⚠ 备份位置剩余空间不足")
+    
+    def create_backup(self, comment: str = "", check_space: bool = False):
         """
         创建项目备份
+        
+        check_space 为 True 时先预估备份大小，剩余空间不足则不开始备份
         """
+        if check_space:
+            estimate = self.estimate_backup()
+            self.print_estimate(estimate)
+            if not estimate["fits"]:
+                print(f"✗ 备份失败: 备份位置剩余空间不足，预计需要 {format_size(estimate['estimated_size'])}")
+                return None
+        
         try:
             # 生成时间戳和版本号
             timestamp = datetime.datetime.now()
@@ -231,27 +685,37 @@ class ProjectBackupTool:
             if comment:
                 backup_name += f"_{comment.replace(' ', '_')}"
             
-            # 直接保存到用户选择的备份目录
-            backup_path = self.backup_dir / backup_name
+            # 直接保存到用户选择的备份目录（或配置的存储后端）
+            backup_key = backup_name
             
             # 如果是压缩模式
             if self.config.get("compression", True):
-                backup_path = backup_path.with_suffix('.zip')
-                self.create_zip_backup(backup_path, version_id)
+                backup_key = Path(backup_name).with_suffix('.zip').name
+                with self.storage.open_write(backup_key) as backup_file:
+                    file_hashes = self.create_zip_backup(backup_file, version_id)
             else:
-                backup_path.mkdir(parents=True, exist_ok=True)
-                self.create_folder_backup(backup_path, version_id)
+                file_hashes = self.create_folder_backup(backup_key, version_id)
+            
+            backup_path = self.storage.uri(backup_key)
             
             # 记录备份信息
             backup_info = {
                 "id": version_id,
                 "name": backup_name,
                 "timestamp": timestamp.isoformat(),
-                "path": str(backup_path),
+                "path": backup_path,
                 "comment": comment,
                 "compression": self.config.get("compression", True)
             }
             
+            # 保存 Merkle 校验清单，根哈希记录到备份日志（低内存模式下不生成）
+            if self.config.get("hash_check", True) and not self.config.get("low_memory", False):
+                from backup_manifest import create_manifest, save_manifest
+                
+                manifest = create_manifest(file_hashes)
+                save_manifest(self.manifest_path(version_id), manifest)
+                backup_info["merkle_root"] = manifest["root"]
+            
             self.backup_log.append(backup_info)
             self.save_backup_log()
             
@@ -261,25 +725,522 @@ class ProjectBackupTool:
             print(f"✗ 备份失败: {e}")
             return None
     
+    def create_batch_backup(self, source_dirs: List[str], comment: str = ""):
+        """
+        批量备份多个项目，相同内容的文件在整个批次中只读取一次哈希、只保存一份
+        
+        压缩包结构：
+          blobs/<编号>              去重后的文件内容
+          manifests/<项目名>.json   每个项目的清单：相对路径 -> [内容编号, 大小, 修改时间, 权限, SHA-256]
+        """
+        import zipfile
+        from collections import Counter
+        from concurrent.futures import ThreadPoolExecutor
+        
+        try:
+            timestamp = datetime.datetime.now()
+            version_id = f"v{len(self.backup_log) + 1:03d}_{timestamp.strftime('%Y%m%d_%H%M%S')}"
+            # 同一个目录写了多次（如 p1 和 ./p1）时只备份一次
+            sources = []
+            for source_dir in source_dirs:
+                source = Path(source_dir).resolve()
+                if source in sources:
+                    print(f"⚠ 忽略重复的项目目录: {source_dir}")
+                    continue
+                sources.append(source)
+            
+            # 项目名称使用目录名称，重名时加序号
+            projects = {}
+            for source in sources:
+                name, n = source.name, 2
+                while name in projects:
+                    name, n = f"{source.name}_{n}", n + 1
+                projects[name] = source
+            
+            def walk(source: Path):
+                listing = []
+                for file_path, rel_path in self.iter_source_files(source):
+                    try:
+                        listing.append((file_path, rel_path.as_posix(), file_path.stat()))
+                    except OSError:
+                        continue
+                return listing
+            
+            # 并行遍历所有项目
+            with ThreadPoolExecutor(max_workers=min(len(sources), 8) or 1) as executor:
+                listings = dict(zip(projects, executor.map(walk, projects.values())))
+            
+            # 只有大小相同的文件才可能重复，先并行计算它们的哈希；
+            # 大小唯一的文件在写入时顺便计算哈希，只读取一次
+            size_counts = Counter(st.st_size for listing in listings.values() for _, _, st in listing)
+            candidates = [file_path for listing in listings.values()
+                          for file_path, _, st in listing if size_counts[st.st_size] > 1]
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                candidate_hashes = dict(zip(candidates, executor.map(self.calculate_file_hash, candidates)))
+            
+            backup_name = f"batch_{version_id}"
+            if comment:
+                backup_name += f"_{comment.replace(' ', '_')}"
+            backup_key = Path(backup_name).with_suffix('.zip').name
+            
+            blobs = {}
+            blob_count = 0
+            stored_count = 0
+            manifests = {name: {} for name in projects}
+            total_size = 0
+            stored_size = 0
+            with self.storage.open_write(backup_key) as backup_file, \
+                    zipfile.ZipFile(backup_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for name, listing in listings.items():
+                    for file_path, rel_path, st in listing:
+                        file_hash = candidate_hashes.get(file_path)
+                        if file_hash and file_hash in blobs:
+                            blob_id = blobs[file_hash]
+                        else:
+                            # 编号对每个写入的成员递增：预先计算哈希失败或文件在两次读取之间变化时，
+                            # 写入时的哈希可能与已有内容相同，不能用 len(blobs) 作为编号
+                            blob_id = f"{blob_count:08d}"
+                            blob_count += 1
+                            try:
+                                file_hash = self.write_zip_member(zipf, file_path, f"blobs/{blob_id}")
+                            except OSError as e:
+                                print(f"⚠ 跳过无法读取的文件: {file_path} ({e})")
+                                continue
+                            blobs.setdefault(file_hash, blob_id)
+                            stored_count += 1
+                            stored_size += st.st_size
+                        total_size += st.st_size
+                        manifests[name][rel_path] = [blob_id, st.st_size, st.st_mtime,
+                                                     st.st_mode & 0o7777, file_hash]
+                
+                for name, manifest in manifests.items():
+                    zipf.writestr(f"manifests/{name}.json", json.dumps(manifest, ensure_ascii=False))
+            
+            backup_path = self.storage.uri(backup_key)
+            backup_info = {
+                "id": version_id,
+                "name": backup_name,
+                "timestamp": timestamp.isoformat(),
+                "path": backup_path,
+                "comment": comment,
+                "compression": True,
+                "batch": True,
+                "projects": {name: str(source) for name, source in projects.items()}
+            }
+            self.backup_log.append(backup_info)
+            self.save_backup_log()
+            
+            file_count = sum(len(manifest) for manifest in manifests.values())
+            print(f"✓ 批量备份成功: {backup_path}")
+            print(f"  {len(projects)} 个项目，{file_count} 个文件，去重后保存 {stored_count} 份内容，"
+                  f"节省 {format_size(total_size - stored_size)}")
+            return backup_info
+        except Exception as e:
+            print(f"✗ 备份失败: {e}")
+            return None
+    
+    def restore_batch(self, backup_info: Dict, project: Optional[str] = None,
+                      paths: Optional[List[str]] = None) -> bool:
+        """
+        从批量备份中恢复一个项目到它原来的目录
+        """
+        import zipfile
+        
+        projects = backup_info["projects"]
+        if project is None and len(projects) == 1:
+            project = next(iter(projects))
+        if project not in projects:
+            print(f"✗ 请用 --project 指定要恢复的项目: {', '.join(projects)}")
+            return False
+        
+        target_dir = Path(projects[project])
+        selected = make_path_filter(paths)
+        try:
+            with self.storage.open_read(self.backup_key(backup_info)) as backup_file, \
+                    zipfile.ZipFile(backup_file, 'r') as zipf:
+                manifest = json.loads(zipf.read(f"manifests/{project}.json").decode('utf-8'))
+                
+                target_dir.mkdir(parents=True, exist_ok=True)
+                failed_to_delete = self.new_failure_report("无法删除: ")
+                failed_to_restore = self.new_failure_report("无法恢复: ")
+                if not paths:
+                    self.clear_source_dir(failed_to_delete, target_dir)
+                
+                for rel_file, (blob_id, size, mtime, mode, file_hash) in manifest.items():
+                    if not selected(rel_file):
+                        continue
+                    dest_file = target_dir / rel_file
+                    try:
+                        dest_file.parent.mkdir(parents=True, exist_ok=True)
+                        with zipf.open(f"blobs/{blob_id}") as src, open(dest_file, 'wb') as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                        os.chmod(dest_file, mode)
+                        os.utime(dest_file, (mtime, mtime))
+                    except PermissionError:
+                        failed_to_restore.append(rel_file)
+                    except Exception as e:
+                        failed_to_restore.append(f"{rel_file} ({str(e)})")
+            
+            print(f"✓ 已恢复项目 {project} 到版本: {backup_info['id']}（{target_dir}）")
+            self.report_restore_failures(failed_to_delete, failed_to_restore)
+            return True
+        except Exception as e:
+            print(f"✗ 恢复失败: {e}")
+            return False
+    
+    def create_stream_backup(self, output, stream_format: Optional[str] = None,
+                             volume_size: Optional[int] = None) -> bool:
+        """
+        以流式格式输出备份（不需要可 seek 的本地文件）
+        
+        output 可以是文件/FIFO 路径，也可以是已打开的二进制流（如 sys.stdout.buffer）；
+        stream_format 为 tar（流式 tar）或 zip（带数据描述符的 zip）；
+        指定 volume_size 时输出为 output.000, output.001 ... 固定大小的分卷。
+        流式备份不写入备份日志。
+        """
+        import tarfile
+        import zipfile
+        
+        stream_format = stream_format or self.config.get("stream_format", "tar")
+        compression = self.config.get("compression", True)
+        
+        try:
+            if volume_size:
+                out = VolumeWriter(str(output), volume_size)
+            elif isinstance(output, (str, Path)):
+                out = open(output, 'wb')
+            else:
+                out = output
+            
+            try:
+                if stream_format == "zip" and self.config.get("low_memory", False):
+                    from backup_zip import SpillingZipWriter
+                    
+                    with SpillingZipWriter(out, spill_dir=str(self.backup_dir)) as zipw:
+                        for file_path, rel_path in self.iter_source_files():
+                            zipw.add_file(file_path, rel_path.as_posix())
+                elif stream_format == "zip":
+                    compress_type = zipfile.ZIP_DEFLATED if compression else zipfile.ZIP_STORED
+                    with zipfile.ZipFile(out, 'w', compress_type) as zipf:
+                        for file_path, rel_path in self.iter_source_files():
+                            zipf.write(file_path, rel_path)
+                else:
+                    # "w|" 为流式写入，只向前写，内存占用固定
+                    with tarfile.open(fileobj=out, mode="w|gz" if compression else "w|") as tar:
+                        for file_path, rel_path in self.iter_source_files():
+                            tar.add(file_path, arcname=rel_path.as_posix(), recursive=False)
+                            # 流式写入不需要保留已写入成员的 TarInfo
+                            tar.members.clear()
+            finally:
+                if out is not output:
+                    out.close()
+                else:
+                    out.flush()
+            
+            if volume_size:
+                print(f"✓ 流式备份成功: {len(out.volumes)} 个分卷 {output}.000 ...")
+            else:
+                print(f"✓ 流式备份成功: {output if isinstance(output, (str, Path)) else '标准输出'}")
+            return True
+        except Exception as e:
+            print(f"✗ 备份失败: {e}")
+            return False
+    
+    def restore_stream(self, source, paths: Optional[List[str]] = None) -> bool:
+        """
+        从流式备份恢复
+        
+        source 可以是文件/FIFO 路径、分卷前缀（自动读取 source.000, source.001 ...），
+        也可以是已打开的二进制流（如 sys.stdin.buffer）。
+        tar 边读边解压；zip 需要读取末尾的中央目录，会先写入临时文件（不占用内存）。
+        """
+        import tarfile
+        import tempfile
+        
+        selected = make_path_filter(paths)
+        low_memory = self.config.get("low_memory", False)
+        
+        try:
+            if not isinstance(source, (str, Path)):
+                stream = source
+            elif not os.path.exists(source) and os.path.exists(f"{source}.000"):
+                stream = io.BufferedReader(VolumeReader(str(source)))
+            else:
+                stream = open(source, 'rb')
+            
+            failed_to_delete = self.new_failure_report("无法删除: ")
+            failed_to_restore = self.new_failure_report("无法恢复: ")
+            
+            # 先确认备份流可以识别（zip 读到中央目录，tar 读到第一个成员）再清空源目录，
+            # 空流或无法识别的数据不会删除任何文件
+            try:
+                if not isinstance(stream, io.BufferedReader):
+                    stream = io.BufferedReader(stream)
+                
+                head = stream.peek(4)[:4]
+                if not head:
+                    raise ValueError("备份流为空")
+                if head == b"PK\x03\x04":
+                    with tempfile.TemporaryFile() as spool:
+                        shutil.copyfileobj(stream, spool, 1024 * 1024)
+                        spool.seek(0)
+                        with self.open_zip_for_restore(spool) as zipf:
+                            if not paths:
+                                self.clear_source_dir(failed_to_delete)
+                            for file_info in zipf.infolist():
+                                if not selected(file_info.filename):
+                                    continue
+                                try:
+                                    zipf.extract(file_info, self.source_dir)
+                                except PermissionError:
+                                    failed_to_restore.append(file_info.filename)
+                                except Exception as e:
+                                    failed_to_restore.append(f"{file_info.filename} ({str(e)})")
+                else:
+                    # 新版本 Python 中使用 data 过滤器防止路径穿越
+                    extract_args = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+                    with tarfile.open(fileobj=stream, mode="r|*") as tar:
+                        if not paths:
+                            self.clear_source_dir(failed_to_delete)
+                        for member in tar:
+                            if low_memory:
+                                # 不保留已读取成员的信息（硬链接只能指向仍在列表中的成员）
+                                tar.members.clear()
+                            if not selected(member.name):
+                                continue
+                            try:
+                                tar.extract(member, self.source_dir, **extract_args)
+                            except PermissionError:
+                                failed_to_restore.append(member.name)
+                            except Exception as e:
+                                failed_to_restore.append(f"{member.name} ({str(e)})")
+            finally:
+                if stream is not source:
+                    stream.close()
+            
+            print(f"✓ 已从流式备份恢复: {source if isinstance(source, (str, Path)) else '标准输入'}")
+            self.report_restore_failures(failed_to_delete, failed_to_restore)
+            return True
+        except Exception as e:
+            print(f"✗ 恢复失败: {e}")
+            return False
+    
     def list_backups(self) -> List[Dict]:
         """
         列出所有备份（只返回实际存在的备份）
         """
         # 过滤掉不存在的备份文件
-        existing_backups = []
-        for backup in self.backup_log:
-            if Path(backup["path"]).exists():
-                existing_backups.append(backup)
-            else:
-                # 如果备份文件不存在，从日志中移除
-                self.backup_log = [b for b in self.backup_log if b["id"] != backup["id"]]
-                self.save_backup_log()
+        existing_backups = [b for b in self.backup_log if self.storage.exists(self.backup_key(b))]
+        
+        # 如果备份文件不存在，从日志中移除（只读模式下不改写日志）
+        if len(existing_backups) != len(self.backup_log) and not self.read_only:
+            self.backup_log = existing_backups
+            self.save_backup_log()
         
         return sorted(existing_backups, key=lambda x: x["timestamp"], reverse=True)
     
-    def restore_backup(self, version_id: str):
+    def show_backup(self, version_id: str) -> bool:
+        """
+        显示指定备份的详情（只读）
+        """
+        backup_info = next((b for b in self.backup_log if b["id"] == version_id), None)
+        if not backup_info:
+            print(f"✗ 未找到版本: {version_id}")
+            return False
+        
+        exists = self.storage.exists(self.backup_key(backup_info))
+        print(f"版本ID: {backup_info['id']}")
+        print(f"备份时间: {backup_info['timestamp']}")
+        print(f"注释: {backup_info['comment']}")
+        print(f"备份类型: {'压缩' if backup_info.get('compression', True) else '文件夹'}")
+        print(f"备份路径: {backup_info['path']}")
+        if backup_info.get("batch"):
+            for name, source in backup_info["projects"].items():
+                print(f"项目: {name} -> {source}")
+        print(f"备份文件: {'存在' if exists else '不存在'}")
+        return exists
+    
+    def backup_status(self) -> bool:
+        """
+        输出备份状态（只读）：备份数量、最新备份及其是否存在
+        """
+        summary = self.catalog_summary()
+        latest = summary.get("latest")
+        print(f"备份数量: {summary['count']}")
+        if not latest:
+            print("最新备份: 无")
+            return False
+        
+        exists = self.storage.exists(self.backup_key(latest))
+        print(f"最新备份: {latest['id']} - {latest['timestamp']} - {latest['comment']}")
+        print(f"最新备份文件: {'存在' if exists else '不存在'}")
+        return exists
+    
+    def manifest_path(self, version_id: str) -> Path:
+        """
+        备份校验清单的保存位置
+        """
+        return self.backup_dir / "manifests" / f"{version_id}.json"
+    
+    def load_scrub_state(self) -> Dict:
+        """
+        加载校验状态：每个备份上次校验通过时各存储对象的修改时间
+        """
+        scrub_state_file = self.backup_dir / "scrub_state.json"
+        if scrub_state_file.exists():
+            try:
+                with open(scrub_state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+    
+    def save_scrub_state(self, state: Dict):
+        """
+        保存校验状态
+        """
+        with open(self.backup_dir / "scrub_state.json", 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=4, ensure_ascii=False)
+    
+    def snapshot_objects(self, backup_key: str, manifest: Dict) -> Dict[str, str]:
+        """
+        返回备份中每个文件所在的存储对象：压缩备份都在同一个 zip 中，
+        文件夹备份为文件本身，打包的小文件为所在的打包段
+        """
+        if backup_key.endswith('.zip'):
+            return {rel_file: backup_key for rel_file in manifest["files"]}
+        
+        pack_index = load_pack_index(self.storage, backup_key)
+        objects = {}
+        for rel_file in manifest["files"]:
+            if rel_file in pack_index:
+                objects[rel_file] = f"{backup_key}/{PACK_DIR}/pack_{pack_index[rel_file][0]:05d}.dat"
+            else:
+                objects[rel_file] = f"{backup_key}/{rel_file}"
+        return objects
+    
+    def hash_snapshot_files(self, backup_key: str, rel_files) -> Dict[str, Optional[str]]:
+        """
+        读取备份中的文件并计算哈希（无法读取的文件为 None）
+        """
+        import zipfile
+        from backup_manifest import hash_bytes, hash_stream
+        
+        hashes = {rel_file: None for rel_file in rel_files}
+        if backup_key.endswith('.zip'):
+            try:
+                with self.storage.open_read(backup_key) as backup_file, \
+                        zipfile.ZipFile(backup_file, 'r') as zipf:
+                    for rel_file in hashes:
+                        try:
+                            with zipf.open(rel_file) as f:
+                                hashes[rel_file] = hash_stream(f)
+                        except Exception:
+                            pass
+            except Exception:
+                pass
+            return hashes
+        
+        pack_index = load_pack_index(self.storage, backup_key)
+        packed = {k: pack_index[k] for k in hashes if k in pack_index}
+        try:
+            for rel_file, data, mtime, mode in iter_packed_files(self.storage, backup_key, packed):
+                hashes[rel_file] = hash_bytes(data)
+        except Exception:
+            pass
+        for rel_file in hashes:
+            if rel_file in packed:
+                continue
+            try:
+                with self.storage.open_read(f"{backup_key}/{rel_file}") as f:
+                    hashes[rel_file] = hash_stream(f)
+            except Exception:
+                pass
+        return hashes
+    
+    def scrub_backups(self, version_id: Optional[str] = None) -> bool:
+        """
+        增量校验备份完整性
+        
+        只完整校验上次校验通过后存储修改时间发生变化的对象中的文件，其余文件每次随机抽查
+        scrub_sample_files 个；发现不一致时沿 Merkle 树定位损坏的文件。
+        """
+        import random
+        from backup_manifest import load_manifest, manifest_is_consistent, find_corrupted
+        
+        backups = [b for b in self.backup_log if not version_id or b["id"] == version_id]
+        if version_id and not backups:
+            print(f"✗ 未找到版本: {version_id}")
+            return False
+        
+        sample_files = self.config.get("scrub_sample_files", 32)
+        state = self.load_scrub_state()
+        all_ok = True
+        
+        for backup_info in sorted(backups, key=lambda x: x["timestamp"]):
+            backup_id = backup_info["id"]
+            manifest = load_manifest(self.manifest_path(backup_id))
+            if not backup_info.get("merkle_root") or manifest is None:
+                print(f"⚠ {backup_id}: 没有校验清单，跳过")
+                continue
+            
+            # 先检查清单本身（不读取备份数据）
+            if not manifest_is_consistent(manifest, backup_info["merkle_root"]):
+                print(f"✗ {backup_id}: 校验清单与备份日志中的根哈希不一致（清单可能被篡改）")
+                all_ok = False
+                continue
+            
+            backup_key = self.backup_key(backup_info)
+            if not self.storage.exists(backup_key):
+                print(f"✗ {backup_id}: 备份文件不存在: {backup_info['path']}")
+                all_ok = False
+                continue
+            
+            # 找出上次校验后修改时间变化的存储对象
+            objects = self.snapshot_objects(backup_key, manifest)
+            mtimes = {}
+            for obj in set(objects.values()):
+                try:
+                    mtimes[obj] = self.storage.mtime(obj)
+                except Exception:
+                    mtimes[obj] = None
+            previous = state.get(backup_id, {}).get("mtimes", {})
+            changed = {obj for obj, mtime in mtimes.items() if mtime is None or previous.get(obj) != mtime}
+            
+            # 变化对象中的文件全部校验，其余随机抽查
+            to_check = {rel_file for rel_file, obj in objects.items() if obj in changed}
+            rest = [rel_file for rel_file in objects if rel_file not in to_check]
+            to_check.update(random.sample(rest, min(sample_files, len(rest))))
+            
+            corrupted = find_corrupted(manifest, self.hash_snapshot_files(backup_key, to_check))
+            if corrupted:
+                all_ok = False
+                print(f"✗ {backup_id}: 发现 {len(corrupted)} 个损坏的文件:")
+                for item in corrupted[:10]:  # 只显示前10个
+                    print(f"  - {item}")
+                if len(corrupted) > 10:
+                    print(f"  ... 以及 {len(corrupted) - 10} 个其他文件")
+            else:
+                print(f"✓ {backup_id}: 校验通过（本次校验 {len(to_check)}/{len(objects)} 个文件）")
+            
+            # 只记录完整校验通过的对象，下次跳过
+            bad_objects = {objects[rel_file] for rel_file in corrupted}
+            verified = dict(previous)
+            for obj in changed - bad_objects:
+                if mtimes[obj] is not None:
+                    verified[obj] = mtimes[obj]
+            state[backup_id] = {"mtimes": verified, "scrubbed_at": datetime.datetime.now().isoformat()}
+        
+        self.save_scrub_state(state)
+        return all_ok
+    
+    def restore_backup(self, version_id: str, paths: Optional[List[str]] = None,
+                       project: Optional[str] = None):
         """
         恢复到指定版本
+        
+        指定 paths 时只恢复这些文件/目录（选择性恢复），不清空源目录；
+        批量备份需要用 project 指定要恢复的项目
         """
         # 查找指定版本
         backup_info = next((b for b in self.backup_log if b["id"] == version_id), None)
@@ -287,32 +1248,32 @@ class ProjectBackupTool:
             print(f"✗ 未找到版本: {version_id}")
             return False
         
-        backup_path = Path(backup_info["path"])
-        if not backup_path.exists():
-            print(f"✗ 备份文件不存在: {backup_path}")
+        backup_key = self.backup_key(backup_info)
+        if not self.storage.exists(backup_key):
+            print(f"✗ 备份文件不存在: {backup_info['path']}")
             return False
         
+        if backup_info.get("batch"):
+            return self.restore_batch(backup_info, project, paths)
+        
+        selected = make_path_filter(paths)
+        
         try:
             # 清空源目录，跳过无法删除的文件
-            failed_to_delete = []
-            for item in self.source_dir.iterdir():
-                try:
-                    if item.is_file():
-                        item.unlink()
-                    else:
-                        shutil.rmtree(item)
-                except PermissionError:
-                    failed_to_delete.append(str(item))
-                except Exception as e:
-                    failed_to_delete.append(f"{item} ({str(e)})")
+            failed_to_delete = self.new_failure_report("无法删除: ")
+            if not paths:
+                self.clear_source_dir(failed_to_delete)
             
             # 恢复备份，跳过无法写入的文件
-            failed_to_restore = []
+            failed_to_restore = self.new_failure_report("无法恢复: ")
             
-            if backup_path.suffix == '.zip':
-                # 从压缩文件恢复
-                with zipfile.ZipFile(backup_path, 'r') as zipf:
+            if backup_key.endswith('.zip'):
+                # 从压缩文件恢复（远程存储上按范围读取，只下载需要的成员）
+                with self.storage.open_read(backup_key) as backup_file, \
+                        self.open_zip_for_restore(backup_file) as zipf:
                     for file_info in zipf.infolist():
+                        if not selected(file_info.filename):
+                            continue
                         try:
                             zipf.extract(file_info, self.source_dir)
                         except PermissionError:
@@ -321,43 +1282,106 @@ class ProjectBackupTool:
                             failed_to_restore.append(f"{file_info.filename} ({str(e)})")
             else:
                 # 从文件夹恢复
-                for root, dirs, files in os.walk(backup_path):
-                    rel_path = Path(root).relative_to(backup_path)
-                    for file in files:
-                        src_file = Path(root) / file
-                        dest_file = self.source_dir / rel_path / file
-                        try:
-                            dest_file.parent.mkdir(parents=True, exist_ok=True)
-                            shutil.copy2(src_file, dest_file)
-                        except PermissionError:
-                            failed_to_restore.append(str(rel_path / file))
-                        except Exception as e:
-                            failed_to_restore.append(f"{rel_path / file} ({str(e)})")
+                for rel_file in self.storage.list_files(backup_key):
+                    if rel_file.startswith(PACK_DIR + "/") or not selected(rel_file):
+                        continue
+                    dest_file = self.source_dir / rel_file
+                    try:
+                        dest_file.parent.mkdir(parents=True, exist_ok=True)
+                        self.storage.get_file(f"{backup_key}/{rel_file}", dest_file)
+                    except PermissionError:
+                        failed_to_restore.append(rel_file)
+                    except Exception as e:
+                        failed_to_restore.append(f"{rel_file} ({str(e)})")
+                
+                # 恢复打包的小文件
+                pack_index = load_pack_index(self.storage, backup_key)
+                if paths:
+                    pack_index = {k: v for k, v in pack_index.items() if selected(k)}
+                for rel_file, data, mtime, mode in iter_packed_files(self.storage, backup_key, pack_index):
+                    dest_file = self.source_dir / rel_file
+                    try:
+                        dest_file.parent.mkdir(parents=True, exist_ok=True)
+                        dest_file.write_bytes(data)
+                        os.chmod(dest_file, mode)
+                        os.utime(dest_file, (mtime, mtime))
+                    except PermissionError:
+                        failed_to_restore.append(rel_file)
+                    except Exception as e:
+                        failed_to_restore.append(f"{rel_file} ({str(e)})")
             
             # 输出恢复结果
             print(f"✓ 已恢复到版本: {version_id}")
-            
-            # 输出无法删除的文件信息
-            if failed_to_delete:
-                print(f"⚠ 以下 {len(failed_to_delete)} 个文件/目录无法删除（权限问题）:")
-                for item in failed_to_delete[:10]:  # 只显示前10个
-                    print(f"  - {item}")
-                if len(failed_to_delete) > 10:
-                    print(f"  ... 以及 {len(failed_to_delete) - 10} 个其他项目")
-            
-            # 输出无法恢复的文件信息
-            if failed_to_restore:
-                print(f"⚠ 以下 {len(failed_to_restore)} 个文件无法恢复（权限问题）:")
-                for item in failed_to_restore[:10]:  # 只显示前10个
-                    print(f"  - {item}")
-                if len(failed_to_restore) > 10:
-                    print(f"  ... 以及 {len(failed_to_restore) - 10} 个其他文件")
-            
+            self.report_restore_failures(failed_to_delete, failed_to_restore)
             return True
         except Exception as e:
             print(f"✗ 恢复失败: {e}")
             return False
     
+    def open_zip_for_restore(self, fp):
+        """
+        打开要恢复的压缩包：低内存模式下逐条读取中央目录，不一次性加载所有成员信息
+        """
+        if self.config.get("low_memory", False):
+            from backup_zip import ZipMemberReader
+            return ZipMemberReader(fp)
+        import zipfile
+        return zipfile.ZipFile(fp, 'r')
+    
+    def new_failure_report(self, label: str) -> FailureReport:
+        """
+        创建恢复失败记录（低内存模式下完整列表写入备份目录中的报告文件）
+        """
+        report_file = None
+        if self.config.get("low_memory", False):
+            timestamp_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            report_file = self.backup_dir / f"restore_failures_{timestamp_str}.txt"
+        return FailureReport(report_file, label)
+    
+    def clear_source_dir(self, failed_to_delete: FailureReport,
+                         target_dir: Optional[Path] = None) -> FailureReport:
+        """
+        清空源目录（或指定的目录），跳过无法删除的文件，记录无法删除的项目
+        """
+        for item in (target_dir or self.source_dir).iterdir():
+            try:
+                if item.is_file():
+                    item.unlink()
+                else:
+                    shutil.rmtree(item)
+            except PermissionError:
+                failed_to_delete.append(str(item))
+            except Exception as e:
+                failed_to_delete.append(f"{item} ({str(e)})")
+        return failed_to_delete
+    
+    def report_restore_failures(self, failed_to_delete: FailureReport, failed_to_restore: FailureReport):
+        """
+        输出恢复过程中无法删除/无法恢复的文件
+        """
+        failed_to_delete.close()
+        failed_to_restore.close()
+        
+        # 输出无法删除的文件信息
+        if failed_to_delete:
+            print(f"⚠ 以下 {len(failed_to_delete)} 个文件/目录无法删除（权限问题）:")
+            for item in failed_to_delete.samples:  # 只显示前10个
+                print(f"  - {item}")
+            if len(failed_to_delete) > 10:
+                print(f"  ... 以及 {len(failed_to_delete) - 10} 个其他项目")
+        
+        # 输出无法恢复的文件信息
+        if failed_to_restore:
+            print(f"⚠ 以下 {len(failed_to_restore)} 个文件无法恢复（权限问题）:")
+            for item in failed_to_restore.samples:  # 只显示前10个
+                print(f"  - {item}")
+            if len(failed_to_restore) > 10:
+                print(f"  ... 以及 {len(failed_to_restore) - 10} 个其他文件")
+        
+        report_file = failed_to_delete.report_file or failed_to_restore.report_file
+        if report_file and (failed_to_delete or failed_to_restore):
+            print(f"完整列表已写入: {report_file}")
+    
     def delete_backup(self, version_id: str):
         """
         删除指定备份
@@ -368,16 +1392,21 @@ class ProjectBackupTool:
             print(f"✗ 未找到版本: {version_id}")
             return False
         
-        backup_path = Path(backup_info["path"])
-        if not backup_path.exists():
-            print(f"✗ 备份文件不存在: {backup_path}")
+        backup_key = self.backup_key(backup_info)
+        if not self.storage.exists(backup_key):
+            print(f"✗ 备份文件不存在: {backup_info['path']}")
             return False
         
         try:
-            if backup_path.is_dir():
-                shutil.rmtree(backup_path)
-            else:
-                backup_path.unlink()
+            self.storage.delete(backup_key)
+            
+            # 删除校验清单和校验状态
+            manifest_path = self.manifest_path(version_id)
+            if manifest_path.exists():
+                manifest_path.unlink()
+            scrub_state = self.load_scrub_state()
+            if scrub_state.pop(version_id, None) is not None:
+                self.save_scrub_state(scrub_state)
             
             # 从日志中移除
             self.backup_log = [b for b in self.backup_log if b["id"] != version_id]
@@ -389,6 +1418,104 @@ class ProjectBackupTool:
             print(f"✗ 删除失败: {e}")
             return False
     
+    def compact_backups(self, version_id: Optional[str] = None,
+                        io_limit: Optional[int] = None) -> bool:
+        """
+        整理备份存储
+        
+        文件夹备份中的小文件打包段有未引用的数据（中断的整理留下的段）或未写满时，按相对路径顺序
+        重写到新的紧凑打包段，写好后替换索引，再删除旧段（中途中断不影响原有备份）；
+        同时删除中断的备份留下、没有记录在日志中的本项目备份，并清理已删除备份遗留的校验状态
+        （备份日志无法读取或为空时这两项都不做）。
+        io_limit 为每秒允许读写的字节数（默认取 compact_io_limit，0 表示不限速）。
+        """
+        backups = [b for b in self.backup_log if not version_id or b["id"] == version_id]
+        if version_id and not backups:
+            print(f"✗ 未找到版本: {version_id}")
+            return False
+        
+        if io_limit is None:
+            io_limit = self.config.get("compact_io_limit", 0)
+        throttle = IOThrottle(io_limit)
+        segment_size = self.config.get("pack_segment_size", 64 * 1024 * 1024)
+        state = self.load_scrub_state()
+        reclaimed = 0
+        all_ok = True
+        
+        for backup_info in sorted(backups, key=lambda x: x["timestamp"]):
+            backup_id = backup_info["id"]
+            backup_key = self.backup_key(backup_info)
+            # 压缩备份中每个文件单独压缩，没有可以整理的打包段
+            if backup_key.endswith('.zip') or not self.storage.exists(backup_key):
+                continue
+            
+            index = load_pack_index(self.storage, backup_key)
+            segments = list_pack_segments(self.storage, backup_key)
+            if not index or pack_is_compact(index, segments, segment_size):
+                continue
+            
+            try:
+                before = sum(segments.values())
+                new_index = repack_small_files(self.storage, backup_key, index, segment_size,
+                                               max(segments) + 1, throttle)
+                # 替换索引后新打包段生效，再删除旧段
+                save_pack_index(self.storage, backup_key, new_index)
+                old_keys = {f"{backup_key}/{PACK_DIR}/pack_{segment_no:05d}.dat" for segment_no in segments}
+                for key in old_keys:
+                    self.storage.delete(key)
+                
+                # 旧段的校验状态不再有效，新段会在下次 --scrub 时完整校验
+                if backup_id in state:
+                    mtimes = state[backup_id].get("mtimes", {})
+                    state[backup_id]["mtimes"] = {k: v for k, v in mtimes.items() if k not in old_keys}
+                
+                after = sum(entry[2] for entry in new_index.values())
+                reclaimed += before - after
+                new_segments = len({entry[0] for entry in new_index.values()})
+                print(f"✓ {backup_id}: 重新打包 {len(new_index)} 个文件，"
+                      f"{len(segments)} 个段 -> {new_segments} 个段，回收 {format_size(before - after)}")
+            except Exception as e:
+                print(f"✗ {backup_id}: 整理失败: {e}")
+                all_ok = False
+        
+        # 删除遗留备份，清理已删除备份的校验状态（校验清单由 delete_backup 删除）；
+        # 日志损坏时 backup_log 为空列表，这时不能据此判断哪些备份已删除
+        if not version_id and self.backup_log and self.backup_log_valid:
+            for name in self.find_orphan_backups():
+                try:
+                    self.storage.delete(name)
+                    print(f"✓ 已删除没有记录在日志中的遗留备份: {name}")
+                except Exception as e:
+                    print(f"✗ 无法删除遗留备份 {name}: {e}")
+                    all_ok = False
+            known_ids = {b["id"] for b in self.backup_log}
+            state = {k: v for k, v in state.items() if k in known_ids}
+        self.save_scrub_state(state)
+        
+        print(f"✓ 整理完成，共回收 {format_size(reclaimed)}")
+        return all_ok
+    
+    def find_orphan_backups(self, min_age_hours: float = 24) -> List[str]:
+        """
+        找出存储中属于本项目、但没有记录在备份日志中的备份（中断的备份留下的）
+        
+        按备份名称 {项目名}_v{版本号}_{时间戳}[_{注释}][.zip] 识别，名称中的时间戳
+        不足 min_age_hours 小时的不算（可能是正在进行的备份）
+        """
+        import re
+        
+        pattern = re.compile(re.escape(self.source_dir.name) + r"_v\d{3,}_(\d{8}_\d{6})(_.*|\.zip)?$")
+        logged = {Path(self.backup_key(b)).name for b in self.backup_log}
+        cutoff = datetime.datetime.now() - datetime.timedelta(hours=min_age_hours)
+        orphans = []
+        for name in self.storage.list_root():
+            match = pattern.match(name)
+            if not match or name in logged:
+                continue
+            if datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S") < cutoff:
+                orphans.append(name)
+        return sorted(orphans)
+    
     def clean_old_backups(self):
         """
         清理旧备份，保留最新的N个
@@ -412,21 +1539,87 @@ def main():
     parser = argparse.ArgumentParser(description="项目自动备份工具")
     parser.add_argument("-c", "--create", action="store_true", help="创建备份")
     parser.add_argument("-l", "--list", action="store_true", help="列出所有备份")
+    parser.add_argument("-s", "--show", type=str, help="显示指定版本的详情")
+    parser.add_argument("--status", action="store_true", help="显示备份数量和最新备份状态")
+    parser.add_argument("--scrub", nargs="?", const="all",
+                        help="增量校验备份完整性（可指定版本，默认校验全部）")
     parser.add_argument("-r", "--restore", type=str, help="恢复到指定版本")
     parser.add_argument("-d", "--delete", type=str, help="删除指定版本")
+    parser.add_argument("-b", "--batch", nargs="+", metavar="DIR",
+                        help="批量备份多个项目目录，相同内容的文件只保存一份")
+    parser.add_argument("--project", type=str, help="从批量备份恢复时指定项目名称")
     parser.add_argument("-C", "--comment", type=str, default="", help="备份时添加注释")
+    parser.add_argument("-p", "--path", action="append", help="恢复时只恢复指定的文件/目录（可多次指定）")
+    parser.add_argument("-o", "--output", type=str,
+                        help="与 --create 同时使用：流式输出备份到文件/FIFO，- 表示标准输出")
+    parser.add_argument("--format", choices=["tar", "zip"], help="流式输出格式（默认 tar）")
+    parser.add_argument("--volume-size", type=size_argument, help="流式输出按固定大小分卷，如 100M、4G")
+    parser.add_argument("-R", "--restore-from", type=str,
+                        help="从流式备份/分卷恢复，- 表示标准输入")
+    parser.add_argument("--compact", nargs="?", const="all",
+                        help="整理备份存储：重新打包小文件、清理遗留数据（可指定版本，默认全部）")
+    parser.add_argument("--io-limit", type=size_argument, help="--compact 时每秒允许读写的数据量，如 20M")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="低内存模式：内存占用不随文件数量增长（适用于上千万个文件）")
+    parser.add_argument("-e", "--estimate", action="store_true",
+                        help="预估备份大小和耗时；与 --create 同时使用时空间不足则不备份")
     args = parser.parse_args()
     
-    backup_tool = ProjectBackupTool()
+    if args.output == "-" or args.restore_from == "-":
+        # 标准输出/输入用于传输备份数据，提示信息改为输出到标准错误
+        stdout, stdin = sys.stdout.buffer, sys.stdin.buffer
+        with contextlib.redirect_stdout(sys.stderr):
+            run_command(parser, args, stdout=stdout, stdin=stdin)
+    else:
+        run_command(parser, args)
+
+
+def run_command(parser: argparse.ArgumentParser, args: argparse.Namespace, stdout=None, stdin=None):
+    """
+    执行命令行参数对应的操作
+    """
+    # 列表、详情、状态命令只读，不创建目录也不改写任何文件
+    read_only = not (args.create or args.batch or args.restore_from or args.estimate
+                     or args.restore or args.delete or args.scrub or args.compact)
+    backup_tool = ProjectBackupTool(read_only=read_only)
+    if args.low_memory:
+        backup_tool.config["low_memory"] = True
     
-    if args.create:
-        backup_tool.create_backup(args.comment)
+    if args.create and args.output:
+        volume_size = args.volume_size
+        output = stdout if args.output == "-" else args.output
+        if volume_size and args.output == "-":
+            print("✗ 分卷输出需要指定文件路径")
+            return
+        backup_tool.create_stream_backup(output, args.format, volume_size)
+    elif args.restore_from:
+        source = stdin if args.restore_from == "-" else args.restore_from
+        backup_tool.restore_stream(source, args.path)
+    elif args.batch:
+        backup_tool.create_batch_backup(args.batch, args.comment)
+    elif args.create:
+        backup_tool.create_backup(args.comment, check_space=args.estimate)
+    elif args.estimate:
+        backup_tool.print_estimate(backup_tool.estimate_backup())
     elif args.list:
         backups = backup_tool.list_backups()
         for backup in backups:
             print(f"{backup['id']} - {backup['timestamp']} - {backup['comment']}")
+    elif args.show:
+        if not backup_tool.show_backup(args.show):
+            sys.exit(1)
+    elif args.status:
+        if not backup_tool.backup_status():
+            sys.exit(1)
+    elif args.scrub:
+        if not backup_tool.scrub_backups(None if args.scrub == "all" else args.scrub):
+            sys.exit(1)
+    elif args.compact:
+        if not backup_tool.compact_backups(None if args.compact == "all" else args.compact,
+                                           args.io_limit):
+            sys.exit(1)
     elif args.restore:
-        backup_tool.restore_backup(args.restore)
+        backup_tool.restore_backup(args.restore, args.path, args.project)
     elif args.delete:
         backup_tool.delete_backup(args.delete)
     else:
@@ -434,4 +1627,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+项目自动备份工具 - 低内存 zip 写入器
+作者：Jay
+版本：1.0
+
+zipfile.ZipFile 会为每个成员在内存中保留一个 ZipInfo（写入时直到关闭、读取时在打开时
+一次性加载整个中央目录），成员数达到千万级时内存占用很大。
+  - SpillingZipWriter 每写完一个成员就把它的中央目录记录写入磁盘上的临时文件，
+    关闭时再按顺序拷贝到输出末尾，内存占用与成员数无关。
+    输出只向前写（使用数据描述符），可以直接写入存储后端的上传流或管道。
+  - ZipMemberReader 分块读取中央目录，逐条返回成员并解压，用于低内存模式下的恢复。
+"""
+
+import os
+import time
+import zlib
+import shutil
+import struct
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_DEFLATED = 8
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+FLAG_ENCRYPTED = 0x01
+ZIP_STORED = 0
+
+
+def _dos_datetime(mtime: float):
+    """
+    转换为 zip 使用的 DOS 日期和时间（早于1980年的按1980-01-01处理）
+    """
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return (1 << 5) | 1, 0
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_date, dos_time
+
+
+class SpillingZipWriter:
+    """
+    中央目录溢写到临时文件的流式 zip 写入器
+    """
+
+    def __init__(self, fp, compresslevel: int = 6, spill_dir: Optional[str] = None,
+                 chunk_size: int = 1024 * 1024):
+        self.fp = fp
+        self.compresslevel = compresslevel
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._offset = 0
+        self._central = tempfile.TemporaryFile(dir=spill_dir)
+        self._central_size = 0
+
+    def _write(self, data: bytes):
+        self.fp.write(data)
+        self._offset += len(data)
+
+    def add_file(self, file_path: Path, arcname: str) -> str:
+        """
+        写入一个文件，返回文件内容的 SHA-256
+        """
+        stat = os.stat(file_path)
+        name = arcname.encode('utf-8')
+        dos_date, dos_time = _dos_datetime(stat.st_mtime)
+        # 与 zipfile 一致：文件可能在读取时变大，预留 5% 余量判断是否需要 zip64
+        zip64 = stat.st_size * 1.05 > ZIP64_LIMIT
+        version = 45 if zip64 else 20
+        flags = FLAG_DATA_DESCRIPTOR | FLAG_UTF8
+        header_offset = self._offset
+
+        # 本地文件头（大小和 CRC 写在数据之后的数据描述符中）
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if zip64 else b""
+        placeholder = ZIP64_LIMIT if zip64 else 0
+        self._write(struct.pack("<4sHHHHHLLLHH", b"PK\x03\x04", version, flags, ZIP_DEFLATED,
+                                dos_time, dos_date, 0, placeholder, placeholder,
+                                len(name), len(extra)) + name + extra)
+
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        digest = hashlib.sha256()
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                crc = zlib.crc32(chunk, crc)
+                digest.update(chunk)
+                file_size += len(chunk)
+                data = compressor.compress(chunk)
+                compress_size += len(data)
+                self._write(data)
+        data = compressor.flush()
+        compress_size += len(data)
+        self._write(data)
+
+        if not zip64 and (file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT):
+            raise RuntimeError(f"文件在备份过程中变大，超过了 zip64 限制: {arcname}")
+
+        # 数据描述符
+        if zip64:
+            self._write(struct.pack("<4sLQQ", b"PK\x07\x08", crc, compress_size, file_size))
+        else:
+            self._write(struct.pack("<4sLLL", b"PK\x07\x08", crc, compress_size, file_size))
+
+        # 中央目录记录，溢写到临时文件
+        zip64_fields = []
+        if file_size >= ZIP64_LIMIT:
+            zip64_fields.append(file_size)
+        if compress_size >= ZIP64_LIMIT:
+            zip64_fields.append(compress_size)
+        if header_offset >= ZIP64_LIMIT:
+            zip64_fields.append(header_offset)
+        central_extra = b""
+        if zip64_fields:
+            central_extra = struct.pack("<HH", 1, 8 * len(zip64_fields)) + \
+                struct.pack(f"<{len(zip64_fields)}Q", *zip64_fields)
+            version = 45
+        record = struct.pack(
+            "<4sHHHHHHLLLHHHHHLL", b"PK\x01\x02", (3 << 8) | version, version, flags,
+            ZIP_DEFLATED, dos_time, dos_date, crc,
+            min(compress_size, ZIP64_LIMIT), min(file_size, ZIP64_LIMIT),
+            len(name), len(central_extra), 0, 0, 0,
+            (stat.st_mode & 0xFFFF) << 16, min(header_offset, ZIP64_LIMIT)) + name + central_extra
+        self._central.write(record)
+        self._central_size += len(record)
+        self.count += 1
+        return digest.hexdigest()
+
+    def close(self):
+        """
+        写出中央目录和结束记录
+        """
+        if self._central is None:
+            return
+        central_offset = self._offset
+        self._central.seek(0)
+        shutil.copyfileobj(self._central, self.fp, self.chunk_size)
+        self._offset += self._central_size
+        self._central.close()
+        self._central = None
+
+        if (self.count >= 0xFFFF or central_offset >= ZIP64_LIMIT
+                or self._central_size >= ZIP64_LIMIT):
+            zip64_end_offset = self._offset
+            self._write(struct.pack("<4sQHHLLQQQQ", b"PK\x06\x06", 44, (3 << 8) | 45, 45, 0, 0,
+                                    self.count, self.count, self._central_size, central_offset))
+            self._write(struct.pack("<4sLQL", b"PK\x06\x07", 0, zip64_end_offset, 1))
+        self._write(struct.pack("<4sHHHHLLH", b"PK\x05\x06", 0, 0,
+                                min(self.count, 0xFFFF), min(self.count, 0xFFFF),
+                                min(self._central_size, ZIP64_LIMIT),
+                                min(central_offset, ZIP64_LIMIT), 0))
+        self.fp.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._central is not None:
+            self._central.close()
+            self._central = None
+        return False
+
+
+class ZipMember(NamedTuple):
+    """
+    中央目录中的一个成员
+    """
+    filename: str
+    header_offset: int
+    compress_size: int
+    file_size: int
+    crc: int
+    compress_type: int
+    flags: int
+
+    def is_dir(self) -> bool:
+        return self.filename.endswith("/")
+
+
+class ZipMemberReader:
+    """
+    逐条读取 zip 成员的读取器（内存占用与成员数无关）
+
+    打开时只读取结束记录（空文件或不是 zip 时抛出 ValueError），
+    infolist() 每次从中央目录分块读取 chunk_size 字节，用法与 ZipFile 相同。
+    """
+
+    def __init__(self, fp, chunk_size: int = 1024 * 1024):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.count, self._central_size, self._central_offset = self._read_end_record()
+
+    def _read_end_record(self):
+        fp = self.fp
+        fp.seek(0, os.SEEK_END)
+        file_size = fp.tell()
+        # 结束记录 22 字节，后面最多有 65535 字节的注释
+        tail_size = min(file_size, 22 + 0xFFFF)
+        fp.seek(file_size - tail_size)
+        tail = fp.read(tail_size)
+        pos = tail.rfind(b"PK\x05\x06")
+        if pos < 0 or len(tail) - pos < 22:
+            raise ValueError("不是有效的 zip 文件")
+        _, _, _, _, count, central_size, central_offset, _ = struct.unpack(
+            "<4sHHHHLLH", tail[pos:pos + 22])
+
+        if count == 0xFFFF or central_size == ZIP64_LIMIT or central_offset == ZIP64_LIMIT:
+            locator_pos = file_size - tail_size + pos - 20
+            fp.seek(locator_pos)
+            locator = fp.read(20)
+            if len(locator) != 20 or locator[:4] != b"PK\x06\x07":
+                raise ValueError("zip64 结束记录定位器缺失")
+            _, _, zip64_end_offset, _ = struct.unpack("<4sLQL", locator)
+            fp.seek(zip64_end_offset)
+            record = fp.read(56)
+            if len(record) != 56 or record[:4] != b"PK\x06\x06":
+                raise ValueError("zip64 结束记录损坏")
+            _, _, _, _, _, _, _, count, central_size, central_offset = struct.unpack(
+                "<4sQHHLLQQQQ", record)
+        return count, central_size, central_offset
+
+    def infolist(self) -> Iterator[ZipMember]:
+        """
+        按中央目录顺序逐条返回成员
+        """
+        buffer = b""
+        pos = 0
+        position = self._central_offset
+        end = self._central_offset + self._central_size
+        for _ in range(self.count):
+            # 缓冲区中没有完整的记录时补读下一块（解压成员时文件位置会改变，每次重新定位）
+            while (len(buffer) - pos < 46
+                   or len(buffer) - pos < 46 + sum(struct.unpack("<HHH", buffer[pos + 28:pos + 34]))):
+                if position >= end:
+                    raise ValueError("zip 中央目录不完整")
+                self.fp.seek(position)
+                chunk = self.fp.read(min(self.chunk_size, end - position))
+                if not chunk:
+                    raise ValueError("zip 中央目录不完整")
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                position += len(chunk)
+
+            (signature, _, _, flags, compress_type, _, _, crc, compress_size, file_size,
+             name_length, extra_length, comment_length, _, _, _,
+             header_offset) = struct.unpack("<4sHHHHHHLLLHHHHHLL", buffer[pos:pos + 46])
+            if signature != b"PK\x01\x02":
+                raise ValueError("zip 中央目录记录损坏")
+            name = buffer[pos + 46:pos + 46 + name_length]
+            extra = buffer[pos + 46 + name_length:pos + 46 + name_length + extra_length]
+            pos += 46 + name_length + extra_length + comment_length
+
+            # zip64 扩展字段按 原始大小、压缩后大小、偏移 的顺序只保存溢出的值
+            if ZIP64_LIMIT in (file_size, compress_size, header_offset):
+                values = self._zip64_values(extra)
+                if file_size == ZIP64_LIMIT:
+                    file_size = values.pop(0)
+                if compress_size == ZIP64_LIMIT:
+                    compress_size = values.pop(0)
+                if header_offset == ZIP64_LIMIT:
+                    header_offset = values.pop(0)
+
+            filename = name.decode('utf-8' if flags & FLAG_UTF8 else 'cp437')
+            yield ZipMember(filename, header_offset, compress_size, file_size,
+                            crc, compress_type, flags)
+
+    @staticmethod
+    def _zip64_values(extra: bytes) -> list:
+        pos = 0
+        while pos + 4 <= len(extra):
+            header_id, size = struct.unpack("<HH", extra[pos:pos + 4])
+            if header_id == 1:
+                data = extra[pos + 4:pos + 4 + size]
+                return list(struct.unpack(f"<{len(data) // 8}Q", data[:len(data) // 8 * 8]))
+            pos += 4 + size
+        raise ValueError("zip64 扩展字段缺失")
+
+    def extract(self, member: ZipMember, path) -> Path:
+        """
+        解压一个成员到 path 目录（与 ZipFile.extract 一样去掉绝对路径和 ..）
+        """
+        parts = [part for part in member.filename.replace("\\", "/").split("/")
+                 if part not in ("", ".", "..")]
+        target = Path(path).joinpath(*parts)
+        if member.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            return target
+        if member.flags & FLAG_ENCRYPTED:
+            raise RuntimeError(f"不支持加密的 zip 成员: {member.filename}")
+        if member.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+            raise RuntimeError(f"不支持的压缩方式 {member.compress_type}: {member.filename}")
+
+        self.fp.seek(member.header_offset)
+        header = self.fp.read(30)
+        if len(header) != 30 or header[:4] != b"PK\x03\x04":
+            raise ValueError(f"zip 本地文件头损坏: {member.filename}")
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        self.fp.seek(member.header_offset + 30 + name_length + extra_length)
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        decompressor = zlib.decompressobj(-15) if member.compress_type == ZIP_DEFLATED else None
+        remaining = member.compress_size
+        crc = 0
+        with open(target, 'wb') as f:
+            while remaining:
+                chunk = self.fp.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise ValueError(f"zip 成员数据不完整: {member.filename}")
+                remaining -= len(chunk)
+                if decompressor is None:
+                    crc = zlib.crc32(chunk, crc)
+                    f.write(chunk)
+                    continue
+                # 限制每次解压输出的大小，高压缩比的数据也不会占用大量内存
+                while chunk:
+                    data = decompressor.decompress(chunk, self.chunk_size)
+                    crc = zlib.crc32(data, crc)
+                    f.write(data)
+                    chunk = decompressor.unconsumed_tail
+            if decompressor:
+                data = decompressor.flush()
+                crc = zlib.crc32(data, crc)
+                f.write(data)
+        if crc != member.crc:
+            raise ValueError(f"CRC 校验失败: {member.filename}")
+        return target
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
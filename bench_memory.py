@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+项目自动备份工具 - 低内存模式峰值内存测试
+作者：Jay
+版本：1.0
+
+在临时目录中生成不同数量的小文件，分别用普通模式和低内存模式创建压缩备份，
+再用低内存模式从备份恢复，在独立进程中统计峰值内存（RSS）。低内存模式下，
+文件数量增加时备份和恢复的峰值内存都应保持不变，超过允许的增长量时返回码为 1。
+
+仅支持 Linux / macOS（依赖 resource 模块）。
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+
+TOOL_DIR = Path(__file__).resolve().parent
+
+CHILD_SCRIPT = """
+import sys
+import resource
+from backup_tool import ProjectBackupTool
+
+tool = ProjectBackupTool()
+if sys.argv[1] == "backup":
+    if not tool.create_backup("bench"):
+        sys.exit(1)
+elif not tool.restore_backup(tool.backup_log[-1]["id"]):
+    sys.exit(1)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# Linux 上单位为 KB，macOS 上单位为字节
+print(peak * 1024 if sys.platform != "darwin" else peak)
+"""
+
+
+def make_tree(source_dir: Path, start: int, file_count: int):
+    """
+    把小文件数量从 start 增加到 file_count，每个目录 1000 个
+    """
+    for i in range(start, file_count):
+        dir_path = source_dir / f"d{i // 1000:05d}"
+        if i == start or i % 1000 == 0:
+            dir_path.mkdir(parents=True, exist_ok=True)
+        (dir_path / f"file_{i:08d}.txt").write_text(f"file {i}\n")
+
+
+def peak_rss(work_dir: Path, source_dir: Path, low_memory: bool, action: str = "backup") -> int:
+    """
+    在独立进程中创建一次备份（action 为 restore 时从最新备份恢复），返回峰值内存（字节）
+    """
+    backup_dir = work_dir / ("backups_low" if low_memory else "backups")
+    config = {
+        "source_dir": str(source_dir),
+        "backup_dir": str(backup_dir),
+        "compression": True,
+        "scan_cache": False,
+        "low_memory": low_memory,
+    }
+    (work_dir / "config.json").write_text(json.dumps(config), encoding="utf-8")
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(TOOL_DIR), env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, action], cwd=work_dir, env=env,
+                            capture_output=True, text=True, check=True)
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="测试低内存模式下峰值内存是否随文件数量增长")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10000, 50000, 100000],
+                        help="测试的文件数量")
+    parser.add_argument("--tolerance", type=float, default=8.0,
+                        help="低内存模式允许的峰值内存增长（MB）")
+    args = parser.parse_args()
+
+    counts = sorted(args.counts)
+    low_memory_peaks = []
+    restore_peaks = []
+    print(f"{'文件数':>10}{'普通模式':>14}{'低内存模式':>14}{'低内存恢复':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        source_dir = work_dir / "source"
+        created = 0
+        for count in counts:
+            # 在上一轮的基础上继续生成文件
+            make_tree(source_dir, created, count)
+            created = count
+            normal = peak_rss(work_dir, source_dir, low_memory=False)
+            low = peak_rss(work_dir, source_dir, low_memory=True)
+            restore = peak_rss(work_dir, source_dir, low_memory=True, action="restore")
+            low_memory_peaks.append(low)
+            restore_peaks.append(restore)
+            print(f"{count:>10}{normal / 1024 / 1024:>12.1f}MB{low / 1024 / 1024:>12.1f}MB"
+                  f"{restore / 1024 / 1024:>12.1f}MB")
+
+    growth = (low_memory_peaks[-1] - low_memory_peaks[0]) / 1024 / 1024
+    restore_growth = (restore_peaks[-1] - restore_peaks[0]) / 1024 / 1024
+    print(f"低内存模式峰值内存增长: 备份 {growth:.1f}MB，恢复 {restore_growth:.1f}MB"
+          f"（允许 {args.tolerance:.1f}MB）")
+    if max(growth, restore_growth) > args.tolerance:
+        print("✗ 低内存模式的峰值内存随文件数量增长")
+        sys.exit(1)
+    print("✓ 低内存模式的峰值内存保持平稳")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+项目自动备份工具 - 命令行启动时间测试
+作者：Jay
+版本：1.0
+
+在当前目录（使用当前目录的 config.json）多次启动新的 Python 进程，
+统计导入模块以及 --list、--status 等只读命令的冷启动耗时。
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+
+TOOL = Path(__file__).resolve().parent / "backup_tool.py"
+
+COMMANDS = {
+    "python（空进程）": [sys.executable, "-c", "pass"],
+    "import backup_tool": [sys.executable, "-c", "import backup_tool"],
+    "--list": [sys.executable, str(TOOL), "--list"],
+    "--status": [sys.executable, str(TOOL), "--status"],
+}
+
+
+def measure(command, runs: int) -> list:
+    """
+    运行命令 runs 次，返回每次的耗时（毫秒）
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(TOOL.parent), env.get("PYTHONPATH")]))
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="测试备份工具命令行的冷启动时间")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="每个命令的运行次数")
+    args = parser.parse_args()
+
+    print(f"{'命令':<24}{'中位数':>10}{'平均':>10}{'最小':>10}")
+    for name, command in COMMANDS.items():
+        timings = measure(command, args.runs)
+        print(f"{name:<24}{statistics.median(timings):>8.1f}ms"
+              f"{statistics.mean(timings):>8.1f}ms{min(timings):>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()